@@ -26,14 +26,9 @@ class AutoSign:
         LL.log(1, '获取未签到的任务')
         headers = self.session.headers
         headers['Content-Type'] = 'application/json'
-        # 第一次请求接口获取cookies（MOD_AUTH_CAS）
         url = f'{self.host}wec-counselor-sign-apps/stu/sign/getStuSignInfosInOneDay'
-        self.session.post(url, headers=headers,
-                          data=json.dumps({}), verify=False)
-        # 第二次请求接口，真正的拿到具体任务
-        res = self.session.post(url, headers=headers,
-                                data=json.dumps({}), verify=False)
-        res = res.json()
+        # 同一用户的多个任务共享一次查询结果
+        res = self.signTask_.queryTaskList(url, headers)
         LL.log(1, '返回的列表数据', res['datas'])
 
         # 获取到的任务总表
@@ -52,6 +47,7 @@ class AutoSign:
                             raise TaskError(
                                 f'任务无需签到', 100, self.taskName)
                         LL.log(1, '匹配标题的任务', righttask['taskName'])
+                        self.signTask_.learnWindow(righttask)
                         self.taskInfo = {'signInstanceWid': righttask['signInstanceWid'],
                                          'signWid': righttask['signWid'], 'taskName': righttask['taskName']}
                         return self.taskInfo
@@ -69,6 +65,7 @@ class AutoSign:
             latestTask = taskList[0]
             self.taskName = latestTask['taskName']
             LL.log(1, '最后一个未签到的任务', latestTask['taskName'])
+            self.signTask_.learnWindow(latestTask)
             self.taskInfo = {'signInstanceWid': latestTask['signInstanceWid'],
                              'signWid': latestTask['signWid'], 'taskName': latestTask['taskName']}
             return self.taskInfo
@@ -158,6 +155,8 @@ class AutoSign:
         res = res.json()
         LL.log(1, '签到任务的详情', res['datas'])
         self.task = res['datas']
+        # 详情中也可能包含时间窗口
+        self.signTask_.learnWindow(self.task)
         return self.task
 
     # 填充表单
@@ -321,6 +320,8 @@ class AutoSign:
         LL.log(1, '即将提交的信息', headers, self.submitData)
         res = self.session.post(f'{self.host}wec-counselor-sign-apps/stu/sign/submitSign', headers=headers,
                                 data=json.dumps(self.submitData), verify=False)
+        # 提交后任务列表已经变化, 丢弃缓存的查询结果
+        self.signTask_.listCache.clear()
         res = res.json()
         LL.log(1, '提交后返回的信息', res)
         # 检查签到情况
@@ -82,6 +82,7 @@ class Collection:
                 self.formWid = task['formWid']
                 self.instanceWid = task.get('instanceWid', '')
                 self.taskName = task['subject']
+                self.signTask_.learnWindow(task)
                 # 获取任务详情
                 url = f'{self.host}wec-counselor-collector-apps/stu/collector/detailCollector'
                 params = {"collectorWid": self.wid,
@@ -1,4 +1,3 @@
-import requests
 import smtplib
 from email.mime.text import MIMEText
 from email.header import Header
@@ -9,6 +8,8 @@ from urllib import parse
 import json
 import apprise
 
+from liteTools import reqSession
+
 
 # 通知类
 class SendMessage:
@@ -95,7 +96,7 @@ class RlMessage:
         # 若离邮件api， 将会存储消息到数据库，并保存1周以供查看，请勿乱用，谢谢合作
         if self.configIsCorrect:
             params = {"recipient": self.mail, "title": title, "content": msg}
-            res = requests.post(url=self.apiUrl, params=json.dumps(params))
+            res = reqSession.shared().post(url=self.apiUrl, params=json.dumps(params))
             res = res.json()
             return res["message"]
         else:
@@ -148,7 +149,7 @@ class Pushplus:
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:92.0) Gecko/20100101 Firefox/92.0"
             }
-            res = requests.post(self.api, headers=headers, params=params)
+            res = reqSession.shared().post(self.api, headers=headers, params=params)
             if res.status_code == 200:
                 return "发送成功"
             else:
@@ -182,7 +183,7 @@ class Serverchan:
 
         params = {"title": str(title), "desp": "\n".join(msgs)}
         # 准备发送
-        res = requests.post(
+        res = reqSession.shared().post(
             f"https://sctapi.ftqq.com/{self.sendkey}.send", params=params
         )
         return "发送成功" if res.status_code == 200 else "发送失败"
@@ -229,7 +230,7 @@ class Qmsg:
         else:
             # 开始推送
             sendtype = "group/" if self.isGroup else "send/"
-            res = requests.post(
+            res = reqSession.shared().post(
                 url="https://qmsg.zendee.cn/" + sendtype + self.key,
                 data={"msg": msg, "qq": self.qq},
             )
@@ -338,7 +339,7 @@ class IceCream:
             return "无效配置"
         else:
             # 开始推送
-            res = requests.post(
+            res = reqSession.shared().post(
                 url=f"https://ice.ruoli.cc/api/send/{self.token}", data={"msg": msg}
             )
             return str(res.json()["msg"])
@@ -389,7 +390,7 @@ class Gotify:
             "priority": 2,
         }
         # 准备发送
-        res = requests.post(
+        res = reqSession.shared().post(
             f"{self.gotify_url}/message?token={self.gotify_apptoken}", json=params
         )
         return "发送成功" if res.status_code == 200 else "发送失败"
@@ -22,14 +22,9 @@ class sleepCheck:
     def getUnSignedTasks(self):
         headers = self.session.headers
         headers['Content-Type'] = 'application/json'
-        # 第一次请求接口获取cookies（MOD_AUTH_CAS）
         url = f'{self.host}wec-counselor-attendance-apps/student/attendance/getStuAttendacesInOneDay'
-        self.session.post(url, headers=headers,
-                          data=json.dumps({}), verify=False)
-        # 第二次请求接口，真正的拿到具体任务
-        res = self.session.post(url, headers=headers,
-                                data=json.dumps({}), verify=False)
-        res = res.json()
+        # 同一用户的多个任务共享一次查询结果
+        res = self.signTask_.queryTaskList(url, headers)
         LL.log(1, '返回的列表数据', res['datas'])
 
         # 获取到的任务总表
@@ -47,6 +42,7 @@ class sleepCheck:
                         if not i <= signLevel:
                             raise TaskError(f'任务无需签到', 100, self.taskName)
                         LL.log(1, '匹配标题的任务', righttask['taskName'])
+                        self.signTask_.learnWindow(righttask)
                         self.taskInfo = {'signInstanceWid': righttask['signInstanceWid'],
                                          'signWid': righttask['signWid'], 'taskName': righttask['taskName']}
                         return self.taskInfo
@@ -64,6 +60,7 @@ class sleepCheck:
             latestTask = taskList[0]
             self.taskName = latestTask['taskName']
             LL.log(1, '最后一个未签到的任务', latestTask['taskName'])
+            self.signTask_.learnWindow(latestTask)
             self.taskInfo = {'signInstanceWid': latestTask['signInstanceWid'],
                              'signWid': latestTask['signWid'], 'taskName': latestTask['taskName']}
             return self.taskInfo
@@ -78,6 +75,8 @@ class sleepCheck:
         res = res.json()
         LL.log(1, '具体查寝任务', res['datas'])
         self.task = res['datas']
+        # 详情中也可能包含时间窗口
+        self.signTask_.learnWindow(self.task)
         return self.task
 
     # 获取历史签到任务详情
@@ -260,6 +259,8 @@ class sleepCheck:
         LL.log(1, '提交查寝数据', 'data', self.submitData, 'header', headers)
         res = self.session.post(f'{self.host}wec-counselor-attendance-apps/student/attendance/submitSign', headers=headers,
                                 data=json.dumps(self.submitData), verify=False)
+        # 提交后任务列表已经变化, 丢弃缓存的查询结果
+        self.signTask_.listCache.clear()
         res = res.json()
         LL.log(1, '提交后返回的信息', res)
         # 检查签到情况
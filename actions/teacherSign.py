@@ -22,14 +22,9 @@ class teacherSign:
     def getUnSignedTasks(self):
         headers = self.session.headers
         headers['Content-Type'] = 'application/json'
-        # 第一次请求接口获取cookies（MOD_AUTH_CAS）
         url = f'{self.host}wec-counselor-teacher-sign-apps/teacher/sign/getTeacherSignInfosInOneDay'
-        self.session.post(url, headers=headers,
-                          data=json.dumps({}), verify=False)
-        # 第二次请求接口，真正的拿到具体任务
-        res = self.session.post(url, headers=headers,
-                                data=json.dumps({}), verify=False)
-        res = res.json()
+        # 同一用户的多个任务共享一次查询结果
+        res = self.signTask_.queryTaskList(url, headers)
         if len(res['datas']['unSignedTasks']) < 1:
             raise TaskError('当前暂时没有未签到的任务哦！', 400)
         LL.log(1, '未签到的政工签到', res['datas'])
@@ -131,6 +126,8 @@ class teacherSign:
         LL.log(1, '提交查寝数据', 'data', self.submitData, 'header', headers)
         res = self.session.post(f'{self.host}wec-counselor-teacher-sign-apps/teacher/sign/submitSign', headers=headers,
                                 data=json.dumps(self.submitData), verify=False)
+        # 提交后任务列表已经变化, 丢弃缓存的查询结果
+        self.signTask_.listCache.clear()
         res = res.json()
         # 检查签到情况
         if self.getDetailTask()['signTime']:
@@ -0,0 +1,136 @@
+"""
+滑块验证码识别的回归测试(准确率、耗时、内存)
+对验证码目录中的每个验证码, 统计各识别实现的准确率、p50/p95耗时、峰值内存(tracemalloc)
+指定了基准文件时与基准比较, 准确率下降或耗时/内存超出容差时以非0状态退出
+
+用法:
+    python benchmarks/captchaBench.py [验证码目录] [--baseline 基准文件] [--save-baseline]
+    python benchmarks/captchaBench.py --generate 验证码目录 [-n 数量]  # 生成随机验证码并保存
+验证码文件(*.json)为{"smallImage": ..., "bigImage": ..., "slide": 正确的滑行像素}
+未指定目录时使用固定随机种子生成的验证码
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from liteTools import Image  # noqa: E402
+from slideCaptchaBench import legacySolveSlide, loadCorpus, makeCaptcha  # noqa: E402
+
+solvers = {
+    "coarseToFine": lambda c: Image.solve_slide(c["smallImage"], c["bigImage"]),
+    "exhaustive": lambda c: Image.solve_slide(c["smallImage"], c["bigImage"], exhaustive=True),
+    "legacy": lambda c: legacySolveSlide(c["smallImage"], c["bigImage"]),
+}
+
+
+def measure(solver, corpus: dict, tolerance: int, repeat: int):
+    """
+    :return dict: {"accuracy": 准确率, "p50": 耗时中位数(ms), "p95": 95分位耗时(ms), "peakMemory": 峰值内存(KB)}
+    """
+    correct = 0
+    times = []
+    for captcha in corpus.values():
+        solver(captcha)  # 预热(只计最后几次的耗时)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = solver(captcha)
+            times.append((time.perf_counter() - start) * 1000)
+        if abs(int(result["slide"]) - captcha["slide"]) <= tolerance:
+            correct += 1
+    # tracemalloc会拖慢执行, 单独测量内存
+    peak = 0
+    tracemalloc.start()
+    for captcha in corpus.values():
+        tracemalloc.reset_peak()
+        solver(captcha)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return {
+        "accuracy": correct / len(corpus),
+        "p50": float(np.percentile(times, 50)),
+        "p95": float(np.percentile(times, 95)),
+        "peakMemory": peak / 1024,
+    }
+
+
+def compare(name: str, result: dict, baseline: dict, args):
+    """:return list: 相对于基准的退化项"""
+    regressions = []
+    if result["accuracy"] < baseline["accuracy"] - 1e-9:
+        regressions.append(f"{name}准确率{result['accuracy']:.1%} < 基准{baseline['accuracy']:.1%}")
+    for key in ("p50", "p95"):
+        if result[key] > baseline[key] * (1 + args.latency_tolerance):
+            regressions.append(f"{name}{key}耗时{result[key]:.1f}ms > 基准{baseline[key]:.1f}ms")
+    if result["peakMemory"] > baseline["peakMemory"] * (1 + args.memory_tolerance):
+        regressions.append(f"{name}峰值内存{result['peakMemory']:.0f}KB > 基准{baseline['peakMemory']:.0f}KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpusDir", nargs="?", help="验证码目录(*.json)")
+    parser.add_argument("-n", "--number", type=int, default=20, help="生成的验证码数量")
+    parser.add_argument("--generate", metavar="DIR", help="生成随机验证码保存到该目录后退出")
+    parser.add_argument("--solvers", default="coarseToFine,exhaustive",
+                        help=f"要测试的识别实现(逗号分隔, 可选{','.join(solvers)})")
+    parser.add_argument("--tolerance", type=int, default=3, help="识别结果与正确值相差不超过该像素数视为正确")
+    parser.add_argument("--repeat", type=int, default=3, help="每个验证码计时的次数")
+    parser.add_argument("--baseline", help="基准文件(json)")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基准")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="耗时超出基准的容差(比例)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="峰值内存超出基准的容差(比例)")
+    args = parser.parse_args()
+
+    if args.generate:
+        os.makedirs(args.generate, exist_ok=True)
+        rng = np.random.default_rng(0)
+        for i in range(args.number):
+            with open(os.path.join(args.generate, f"{i:04d}.json"), "w", encoding="utf-8") as f:
+                json.dump(makeCaptcha(rng), f)
+        print(f"已生成{args.number}个验证码到「{args.generate}」")
+        return
+
+    if args.corpusDir:
+        corpus = {k: v for k, v in loadCorpus(args.corpusDir).items() if "slide" in v}
+        if not corpus:
+            sys.exit(f"目录「{args.corpusDir}」中没有带正确滑行像素(slide)的验证码")
+    else:
+        rng = np.random.default_rng(0)
+        corpus = {f"随机生成{i}": makeCaptcha(rng) for i in range(args.number)}
+
+    results = {}
+    print(f"共{len(corpus)}个验证码")
+    print(f"{'识别实现':<16}{'准确率':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'峰值内存(KB)':>14}")
+    for name in args.solvers.split(","):
+        if name not in solvers:
+            sys.exit(f"未知的识别实现「{name}」")
+        results[name] = measure(solvers[name], corpus, args.tolerance, args.repeat)
+        r = results[name]
+        print(f"{name:<16}{r['accuracy']:>8.1%}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['peakMemory']:>14.0f}")
+
+    if not args.baseline:
+        return
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"已保存基准到「{args.baseline}」")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            regressions.extend(compare(name, result, baseline[name], args))
+    if regressions:
+        sys.exit("相对于基准出现退化:\n" + "\n".join(regressions))
+    print("没有相对于基准的退化")
+
+
+if __name__ == "__main__":
+    main()
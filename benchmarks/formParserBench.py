@@ -0,0 +1,122 @@
+"""
+登录表单解析的性能测试
+对比旧的逐个input多次正则匹配的解析方式和FormParser, 并检查两者的解析结果是否一致
+
+用法: python benchmarks/formParserBench.py [保存的登录页面目录(*.html)] [-n 重复次数]
+未指定目录时使用内置的示例页面
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from login.formParser import FormParser  # noqa: E402
+
+samplePage = """<html><head><script>var pwdDefaultEncryptSalt = "abcdefgh12345678";</script></head><body>
+<form id="casLoginForm" method="post" action="/authserver/login">
+<input id="username" name="username" placeholder="用户名" type="text" value="">
+<input id="password" name="password" placeholder="密码" type="password" value="">
+<input type="hidden" name="lt" value="LT-123456-abcdefghijklmnopqrstuvwxyz-cas">
+<input type="hidden" name="dllt" value="userNamePasswordLogin">
+<input type="hidden" name="execution" value="e1s1">
+<input type="hidden" name="_eventId" value="submit">
+<input type="hidden" name="rmShown" value="1">
+<input type="checkbox" name="rememberMe" value="true">
+<input type="submit" value="登录">
+</form>
+<form id="qrLoginForm"><input type="hidden" name="uuid" value="qr"></form>
+<div id="sliderCaptchaDiv"></div>
+</body></html>"""
+
+
+def legacyParse(html: str):
+    """旧的解析方式(与改动前的casLogin.login一致)"""
+    formType = ""
+    if re.findall('<form[^<]*id="casLoginForm"[^>]*>', html, re.I):
+        formType = "casLoginForm"
+    elif re.findall('<form[^<]*id="loginFromId"[^>]*>', html, re.I):
+        formType = "loginFromId"
+    elif re.findall('<form[^<]*id="fm1"[^>]*>', html, re.I):
+        formType = "fm1"
+    params = {}
+    salt = ""
+    for form in re.findall(r"<form[\s\S]*?</form>", html):
+        if re.findall("password", form, re.I):
+            for inputElement in re.findall(r"<input[\s\S]*?>", form):
+                if re.findall(r"EncryptSalt", inputElement, re.I):
+                    salt = re.findall(r'value="(.*?)"', inputElement)[0]
+                if re.findall(
+                    r'type="(?:button|checkbox|file|image|radio|reset|submit)"',
+                    inputElement,
+                ):
+                    continue
+                if re.findall(r"name=", inputElement):
+                    key = re.findall(r'name="(.*?)"', inputElement)[0]
+                else:
+                    continue
+                if re.findall(r"value=", inputElement):
+                    value = re.findall(r'value="(.*?)"', inputElement)[0]
+                else:
+                    value = ""
+                params[key] = value
+    if not salt:
+        maySalt = re.findall(r'var pwdDefaultEncryptSalt ?= ?"(.*?)"', html)
+        if maySalt:
+            salt = maySalt[0]
+    return {
+        "formType": formType,
+        "params": params,
+        "salt": salt,
+        "slider": bool(re.findall("sliderCaptchaDiv", html)),
+    }
+
+
+def timeit(func, html: str, number: int):
+    """:returns float: 每次解析的平均耗时(毫秒)"""
+    start = time.perf_counter()
+    for _ in range(number):
+        func(html)
+    return (time.perf_counter() - start) * 1000 / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pageDir", nargs="?", help="保存的登录页面目录(*.html)")
+    parser.add_argument("-n", "--number", type=int, default=200, help="每个页面的重复次数")
+    args = parser.parse_args()
+
+    if args.pageDir:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(args.pageDir, "*.html"))):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                pages[os.path.basename(path)] = f.read()
+        if not pages:
+            sys.exit(f"目录「{args.pageDir}」中没有html文件")
+    else:
+        pages = {"内置示例页面": samplePage}
+
+    mismatch = 0
+    totalLegacy = totalNew = 0
+    print(f"{'页面':<30}{'旧解析(ms)':>12}{'FormParser(ms)':>16}{'加速比':>8}")
+    for name, html in pages.items():
+        old = legacyParse(html)
+        new = FormParser.parse(html)
+        result = {k: new[k] for k in old}
+        if result != old:
+            mismatch += 1
+            print(f"{name}: 解析结果不一致\n  旧: {old}\n  新: {result}")
+        legacyTime = timeit(legacyParse, html, args.number)
+        newTime = timeit(FormParser.parse, html, args.number)
+        totalLegacy += legacyTime
+        totalNew += newTime
+        print(f"{name:<30}{legacyTime:>12.3f}{newTime:>16.3f}{legacyTime / newTime:>8.1f}")
+    print(f"{'合计':<30}{totalLegacy:>12.3f}{totalNew:>16.3f}{totalLegacy / totalNew:>8.1f}")
+    if mismatch:
+        sys.exit(f"{mismatch}个页面的解析结果不一致")
+
+
+if __name__ == "__main__":
+    main()
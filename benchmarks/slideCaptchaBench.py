@@ -0,0 +1,162 @@
+"""
+滑块验证码识别的性能测试
+对比旧的逐像素循环的实现和Image.solve_slide(逐个位置比较/由粗到细搜索)的耗时, 并检查逐个位置比较的结果与旧实现是否一致
+
+用法: python benchmarks/slideCaptchaBench.py [验证码目录(*.json)] [-n 生成的验证码数量]
+验证码文件为openSliderCaptcha.htl的返回值({"smallImage": ..., "bigImage": ...}), 可以附带正确的滑行像素"slide"
+未指定目录时随机生成验证码
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+import PIL.Image as PIL_Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from liteTools import Image  # noqa: E402
+
+
+def legacySolveSlide(slide_img: str, canvas_img: str) -> dict:
+    """旧的实现(与改动前的Image.solve_slide一致)"""
+    slide_img = base64.b64decode(slide_img)
+    canvas_img = base64.b64decode(canvas_img)
+    slide_img = PIL_Image.open(BytesIO(slide_img)).convert("L")
+    canvas_img = PIL_Image.open(BytesIO(canvas_img)).convert("L")
+    slide_img: np.ndarray = np.array(slide_img)
+    canvas_img: np.ndarray = np.array(canvas_img)
+
+    img_range = np.nonzero(slide_img.sum(axis=1))[0]
+    img_range = (np.min(img_range) - 5, np.max(img_range) + 5)
+    slide_img, canvas_img = (
+        slide_img[img_range[0] : img_range[1], :],
+        canvas_img[img_range[0] : img_range[1], :],
+    )
+
+    def convolution_2d(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+        img_h = img.shape[0]
+        img_w = img.shape[1]
+        img_canvas = np.zeros((img_h + 2, img_w + 2))
+        img_canvas[1:-1, 1:-1] = img
+        result_canvas = np.zeros([img_h, img_w])
+        for i in range(img_h):
+            for j in range(img_w):
+                temp = img_canvas[i : i + 3, j : j + 3]
+                temp = np.multiply(temp, kernel)
+                result_canvas[i][j] = temp.sum()
+        return result_canvas
+
+    def find_edge(img: np.ndarray) -> np.ndarray:
+        sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
+        sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+        img_x = convolution_2d(img, sobel_x)
+        img_y = convolution_2d(img, sobel_y)
+        img_xy = np.sqrt(img_x**2 + img_y**2)
+        img_xy = img_xy * (255 / img_xy.max())
+        return img_xy
+
+    slide_xy = find_edge(slide_img)
+    canvas_xy = find_edge(canvas_img)
+
+    YE = []
+    for x in range(canvas_xy.shape[1] - slide_xy.shape[1]):
+        canvas_slide = np.zeros(canvas_xy.shape)
+        canvas_slide[:, x : x + slide_xy.shape[1]] = slide_xy
+        canvas_overlay = np.abs(canvas_slide - canvas_xy)
+        YE.append(np.sum(canvas_overlay))
+
+    return {
+        "slide": np.argmin(YE),
+        "canvas": canvas_img.shape[1],
+    }
+
+
+def encodeImage(img: PIL_Image.Image) -> str:
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def makeCaptcha(rng: np.random.Generator, width: int = 280, height: int = 155, size: int = 50) -> dict:
+    """
+    随机生成一个滑块验证码(平滑的随机背景, 滑块位置是带白色边框的半透明缺口)
+    :return dict: {"smallImage": ..., "bigImage": ..., "slide": 正确的滑行像素}
+    """
+    # 低分辨率噪声放大得到平滑的背景
+    noise = rng.integers(0, 256, (height // 10 + 1, width // 10 + 1, 3), dtype=np.uint8)
+    canvas = np.array(PIL_Image.fromarray(noise).resize((width, height), PIL_Image.BICUBIC))
+    slide = int(rng.integers(size, width - size))
+    top = int(rng.integers(5, height - size - 5))
+    piece = canvas[top : top + size, slide : slide + size].copy()
+    # 背景中滑块的位置变亮并加上边框(缺口), 滑块图片只有滑块所在的行有内容
+    canvas[top : top + size, slide : slide + size] = (piece * 0.5 + 127).astype(np.uint8)
+    canvas[top : top + size, [slide, slide + size - 1]] = 255
+    canvas[[top, top + size - 1], slide : slide + size] = 255
+    small = np.zeros((height, size, 4), dtype=np.uint8)
+    small[top : top + size, :, :3] = piece
+    small[top : top + size, :, 3] = 255
+    small[top : top + size, [0, -1], :3] = 255
+    small[[top, top + size - 1], :, :3] = 255
+    return {
+        "smallImage": encodeImage(PIL_Image.fromarray(small, "RGBA")),
+        "bigImage": encodeImage(PIL_Image.fromarray(canvas)),
+        "slide": slide,
+    }
+
+
+def loadCorpus(corpusDir: str):
+    """:return dict: {文件名: 验证码}"""
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(corpusDir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = json.load(f)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpusDir", nargs="?", help="验证码目录(*.json)")
+    parser.add_argument("-n", "--number", type=int, default=5, help="未指定目录时生成的验证码数量")
+    args = parser.parse_args()
+
+    if args.corpusDir:
+        corpus = loadCorpus(args.corpusDir)
+        if not corpus:
+            sys.exit(f"目录「{args.corpusDir}」中没有json文件")
+    else:
+        rng = np.random.default_rng(0)
+        corpus = {f"随机生成{i}": makeCaptcha(rng) for i in range(args.number)}
+
+    solvers = {
+        "旧实现": lambda c: legacySolveSlide(c["smallImage"], c["bigImage"]),
+        "逐个比较": lambda c: Image.solve_slide(c["smallImage"], c["bigImage"], exhaustive=True),
+        "由粗到细": lambda c: Image.solve_slide(c["smallImage"], c["bigImage"]),
+    }
+    totalTime = dict.fromkeys(solvers, 0.0)
+    mismatch = 0
+    print(f"{'验证码':<16}{'正确':>6}" + "".join(f"{name:>14}" for name in solvers) + f"{'置信度':>8}")
+    for name, captcha in corpus.items():
+        line = f"{name:<16}{str(captcha.get('slide', '-')):>6}"
+        results = {}
+        for solverName, solver in solvers.items():
+            start = time.perf_counter()
+            results[solverName] = solver(captcha)
+            usedTime = (time.perf_counter() - start) * 1000
+            totalTime[solverName] += usedTime
+            line += f"{int(results[solverName]['slide']):>6}({usedTime:>5.1f}ms)"
+        # 逐个比较与旧实现的结果应该完全一致
+        if int(results["旧实现"]["slide"]) != results["逐个比较"]["slide"]:
+            mismatch += 1
+        print(line + f"{results['由粗到细']['confidence']:>8.2f}")
+    print("合计耗时: " + ", ".join(f"{k}{v:.1f}ms" for k, v in totalTime.items()))
+    if mismatch:
+        sys.exit(f"{mismatch}个验证码逐个比较的结果与旧实现不一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
+import json
+import math
 import random
+import time
 import traceback
+import threading
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-from liteTools import UserDefined, LL, TT, DT, HSF, ST, RT, ProxyGet, TaskError
+from liteTools import UserDefined, LL, TT, DT, HSF, ST, RT, ProxyGet, TaskError, RunClock, CircuitBreaker, CircuitOpenError, reqSession, CaptchaPool, SceneCaptcha
 from actions.teacherSign import teacherSign
 from actions.workLog import workLog
 from actions.sleepCheck import sleepCheck
@@ -10,10 +15,26 @@ from actions.collection import Collection
 from actions.autoSign import AutoSign
 from actions.sendMessage import SendMessage
 from todayLoginService import TodayLoginService
+from taskScheduler import TaskScheduler
+from localStore import SessionCache, RunCheckpoint, CompletionLedger, DeadlineStore, TenantDirectory
 
 
 class SignTask:
     userSessions = {}
+    loginLocks = {}  # 每个uuid一把登录锁, 避免并发执行时同一用户重复登录
+    sessionCache: SessionCache = None  # 登录状态本地缓存(未启用时为None)
+    checkpoint: RunCheckpoint = None  # 任务状态检查点(未启用时为None)
+    ledger: CompletionLedger = None  # 每日完成记录(未启用时为None)
+    ledgerVerifyRate: float = 0  # 命中完成记录时, 仍然联网检查的比例
+    deadlineStore: DeadlineStore = None  # 任务时间窗口记录(未启用时为None)
+    runId: int = 0  # 当前执行批次(常驻模式下每次调度加一), 用于判断复用的Session是否来自之前的批次
+    # 检查缓存的登录状态是否有效时使用的接口(各任务类型获取任务列表的接口)
+    probeApis = {
+        0: 'wec-counselor-collector-apps/stu/collector/queryCollectorProcessingList',
+        1: 'wec-counselor-sign-apps/stu/sign/getStuSignInfosInOneDay',
+        2: 'wec-counselor-attendance-apps/student/attendance/getStuAttendacesInOneDay',
+        4: 'wec-counselor-teacher-sign-apps/teacher/sign/getTeacherSignInfosInOneDay',
+    }
     codeHeadCounts = 5
     statusMsg_lite = {
         0: '待命',
@@ -29,25 +50,39 @@ class SignTask:
         101: "该任务正常执行完成",
         200: "用户设置不执行该任务",
         201: "该任务不在执行时间",
+        202: "该任务今日已完成(本地记录)",
         300: "出错",
         301: "当前情况无法完成该任务",
         400: "没有找到需要执行的任务"
     }
+    # 出现在webhook中的任务状态, 修改时需要重新生成webhook并通知状态监听函数
+    webhookFields = ('code', 'msg', 'attempts', 'missedDeadline')
 
-    def __init__(self, userConfig: dict, maxTry: int = 3):
+    def __init__(self, userConfig: dict, maxTry: int = 3, clock: RunClock = None):
         '''
         :params userConfig: 用户配置
         :params maxTry: 最大尝试次数
+        :params clock: 本次运行的时钟(默认为新建的时钟)
         '''
+        self._webhook: dict = None  # webhook缓存
+        self.statusListener = None  # 任务状态监听函数, 参数为(task, 属性名, 旧值, 新值)
         self.config: dict = userConfig
         self.msg: str = ""
         self.code: int = 0
         self.maxTry: int = int(maxTry)  # 最大触发次数
         self.attempts: int = 0  # 任务触发次数, 当达到最大触发次数, 可能哪怕执行失败也会触发消息推送等
         self.username = userConfig.get("username", "?username?")
+        # 根据用户名和学校给每个用户分配一个uuid。用于一个用户有多个任务时, 登录状态的Sesssion复用。
+        self.uuid: str = HSF.strHash(userConfig.get('schoolName', '') + userConfig.get('username', ''), 256)
+        self.clock: RunClock = clock or RunClock()
+        self._ledgerVerifying: bool = False  # 是否为命中完成记录后的抽查
+        self.listCache: dict = {}  # 任务列表查询结果(同一用户的任务共享, 登录时绑定)
+        self.retryAfter: float = 0  # 至少等待多少秒后再重试(熔断时使用)
+        self.finishTime: float = None  # 最后一次执行结束的时间
+        self.missedDeadline: bool = False  # 是否错过了时间窗口
 
         # 检查任务是否在执行时间
-        if TT.isInTimeList(userConfig['taskTimeRange']):
+        if self.clock.isInTimeList(userConfig['taskTimeRange']):
             self.code = 0
         else:
             self.code = 201
@@ -60,7 +95,11 @@ class SignTask:
         # 检查是否已经完成该任务
         if not self.codeHead == 0:
             return
+        # 检查本地完成记录(命中时不登录, 直接跳过)
+        if self._checkLedger():
+            return
         self.attempts += 1
+        self.retryAfter = 0
         LL.log(1, '即将在第%d轮尝试中为[%s]签到' % (self.attempts, self.username))
 
         # 执行签到
@@ -72,18 +111,63 @@ class SignTask:
         except TaskError as e:
             self.code = e.code
             self.msg = str(e)
+        except CircuitOpenError as e:
+            # 请求没有发出, 但仍然消耗尝试次数(域名持续不可用时, 该域名的任务在本次运行中尽快以失败结束), 等待熔断结束后重试
+            self.code = 1
+            self.msg = str(e)
+            self.retryAfter = e.retryAfter
+            LL.log(2, f"『{self.username}』{e}")
         except Exception as e:
             self.code = 1
             self.msg = f"[{e}]\n{traceback.format_exc()}"
             LL.log(3, ST.notionStr(self.msg),
                    self.config['username']+'签到失败'+self.msg)
         finally:
+            self.finishTime = time.time()
+            # 记录任务状态
+            if SignTask.checkpoint:
+                SignTask.checkpoint.record(
+                    self.taskKey, self.code, self.attempts, self.msg)
+            if SignTask.ledger and self.code in (100, 101) and self.ledgerEligible:
+                if self.code == 101 and self._ledgerVerifying:
+                    LL.log(2, f"『{self.username}』完成记录与实际情况不符(记录为已完成, 实际需要重新提交)")
+                SignTask.ledger.record(self.taskKey, self.ledgerDate)
             # 收尾工作
             self._afterExecute()
 
+    def __setattr__(self, name, value):
+        '''修改任务状态时, 使webhook缓存失效并通知状态监听函数'''
+        if name in SignTask.webhookFields:
+            old = self.__dict__.get(name)
+            object.__setattr__(self, name, value)
+            self._webhook = None
+            if self.statusListener and old != value:
+                self.statusListener(self, name, old, value)
+            return
+        object.__setattr__(self, name, value)
+
     def formatMsg(self, pattern: str = ""):
         return ST.stringFormating(pattern, self.webhook)
 
+    def _checkLedger(self):
+        '''
+        检查本地完成记录, 今日已完成时将任务标记为跳过
+        (按比例抽查: 部分命中的任务仍然联网执行, 以便发现记录与实际情况不符)
+        :returns bool: 是否跳过
+        '''
+        if not (SignTask.ledger and self.ledgerEligible):
+            return False
+        if not SignTask.ledger.isDone(self.taskKey, self.ledgerDate):
+            return False
+        if random.random() < SignTask.ledgerVerifyRate:
+            LL.log(1, f"『{self.username}』今日已完成该任务(本地记录), 抽查: 仍然联网检查")
+            self._ledgerVerifying = True
+            return False
+        LL.log(1, f"『{self.username}』今日已完成该任务(本地记录), 跳过")
+        self.code = 202
+        self.msg = self.statusMsg[202]
+        return True
+
     def _login(self):
         '''
         登录, 更新self.session和self.host
@@ -92,32 +176,91 @@ class SignTask:
         uuid = self.uuid
         userSessions = SignTask.userSessions
 
-        if userSessions.get(uuid):
-            LL.log(1, '正在复用登录Session')
-            uSession = userSessions[uuid]['session']
-            uHost = userSessions[uuid]['host']
-        else:
-            LL.log(1, '正在尝试进行登录')
-            today = TodayLoginService(self.config)
-            today.login()
-            uSession = today.session
-            uHost = today.host
-
-        userSessions[uuid] = {
-            'session': uSession, 'host': uHost}
+        with SignTask.loginLocks.setdefault(uuid, threading.Lock()):
+            if userSessions.get(uuid) and userSessions[uuid]['runId'] != SignTask.runId:
+                # 来自之前批次的Session(常驻模式), 复用前检查是否仍然有效
+                if not TodayLoginService.probeSession(userSessions[uuid]['session'], userSessions[uuid]['host'], self.probeApi):
+                    LL.log(1, '之前的登录Session已失效')
+                    userSessions.pop(uuid)
+            if userSessions.get(uuid):
+                LL.log(1, '正在复用登录Session')
+                uSession = userSessions[uuid]['session']
+                uHost = userSessions[uuid]['host']
+            else:
+                today = TodayLoginService(self.config)
+                if not self._restoreSession(today):
+                    LL.log(1, '正在尝试进行登录')
+                    today.login()
+                    if SignTask.sessionCache:
+                        SignTask.sessionCache.save(uuid, today.dumpSession())
+                uSession = today.session
+                uHost = today.host
+
+            # 同一批次内复用Session时, 任务列表的查询结果也一并复用
+            entry = userSessions.get(uuid)
+            listCache = entry['listCache'] if entry and entry['runId'] == SignTask.runId else {}
+            userSessions[uuid] = {
+                'session': uSession, 'host': uHost, 'runId': SignTask.runId, 'listCache': listCache}
         LL.log(1, '登录完成')
         # 更新数据
         self.session = uSession
         self.host = uHost
+        self.listCache = listCache
         return
 
+    def queryTaskList(self, url: str, headers: dict):
+        '''
+        查询当日任务列表(同一用户同一批次的多个任务共享一次查询结果, 提交表单后失效)
+        :params url: 任务列表接口
+        :returns dict: 接口返回的json
+        '''
+        if url in self.listCache:
+            LL.log(1, '复用本批次已获取的任务列表')
+            return self.listCache[url]
+        # 第一次请求接口获取cookies（MOD_AUTH_CAS）
+        self.session.post(url, headers=headers,
+                          data=json.dumps({}), verify=False)
+        # 第二次请求接口，真正的拿到具体任务
+        res = self.session.post(url, headers=headers,
+                                data=json.dumps({}), verify=False)
+        res = res.json()
+        self.listCache[url] = res
+        return res
+
+    def learnWindow(self, item: dict):
+        '''
+        从任务列表/详情中学习本任务的时间窗口(用于之后按截止时间排序)
+        :params item: 接口返回的任务信息
+        '''
+        if SignTask.deadlineStore:
+            SignTask.deadlineStore.learn(self.taskKey, item)
+
+    def _restoreSession(self, today: TodayLoginService):
+        '''
+        尝试从本地缓存中恢复登录状态
+        :returns bool: 是否恢复成功(缓存存在且通过有效性检查)
+        '''
+        cache = SignTask.sessionCache
+        if not cache:
+            return False
+        sessionData = cache.load(self.uuid)
+        if not sessionData:
+            return False
+        today.restoreSession(sessionData)
+        if today.checkSession(self.probeApi):
+            LL.log(1, '本地缓存的登录状态有效, 跳过登录')
+            return True
+        LL.log(1, '本地缓存的登录状态已失效, 重新登录')
+        cache.drop(self.uuid)
+        # 丢弃恢复的状态, 使用干净的Session登录
+        today.session.cookies.clear()
+        today.host = ''
+        return False
+
     def _beforeExecute(self):
         '''
         执行前准备工作
         '''
-        # 随机延迟
-        RT.randomSleep(self.config['delay'])
-
         # 用户自定义函数触发
         event = {
             "msg": f"『{self.username}』个人任务即将执行",  # 触发消息
@@ -202,6 +345,12 @@ class SignTask:
 
     @ property
     def webhook(self):
+        '''任务状态(状态不变时返回同一个字典, 请不要修改)'''
+        if self._webhook is None:
+            self._webhook = self._buildWebhook()
+        return self._webhook
+
+    def _buildWebhook(self):
         return {
             "scriptVersion": LL.prefix,  # 脚本版本
 
@@ -216,6 +365,7 @@ class SignTask:
             "statusCodehead": self.codeHead,
             "statusMsg": self.statusMsg[self.code],  # 状态信息(完整版)
             "statusMsgLite": self.statusMsg_lite[self.codeHead],  # 状态信息(短版)
+            "missedDeadline": self.missedDeadline,  # 是否错过了时间窗口
         }
 
     @property
@@ -235,17 +385,68 @@ class SignTask:
         return SendMessage(self.config.get('sendMessage'))
 
     @ property
-    def uuid(self):
+    def taskKey(self):
         '''
-        根据用户名和学校给每个用户分配一个uuid。
-        用于一个用户有多个任务时, 登录状态的Sesssion复用。
+        任务标识(用户+任务类型+任务标题), 用于检查点等本地记录
         '''
-        return HSF.strHash(self.config.get('schoolName', '') + self.config.get('username', ''), 256)
+        return f"{self.uuid}:{self.config.get('type')}:{self.config.get('title')}"
+
+    @ property
+    def ledgerEligible(self):
+        '''
+        任务是否适用完成记录: 必须指定了任务标题, 并且已完成的任务不会重复填报
+        (未指定标题时每次获取的是最新的任务, 完成一个并不代表当天没有其他任务)
+        '''
+        if not self.config.get('title'):
+            return False
+        if self.config.get('type') == 0:
+            return self.config.get('signLevel') == 1
+        return self.config.get('signLevel', 1) < 2
+
+    @ property
+    def ledgerDate(self):
+        '''完成记录使用的日期(任务执行时间所在的日期)'''
+        return time.strftime("%Y-%m-%d", time.localtime(self.clock.taskTime))
+
+    @ property
+    def deadline(self):
+        '''
+        任务今天的截止时间(根据之前学习到的时间窗口)
+        :returns float|None: 时间戳, 未知时为None
+        '''
+        if not SignTask.deadlineStore:
+            return None
+        return SignTask.deadlineStore.deadline(self.taskKey, self.ledgerDate)
+
+    @ property
+    def probeApi(self):
+        '''检查登录状态是否有效时使用的接口'''
+        return SignTask.probeApis.get(self.config.get('type'), SignTask.probeApis[1])
 
     @ property
     def codeHead(self):
         return int(self.code/100)
 
+    @ staticmethod
+    def setupLocalStore(config: dict, daemonMode: bool = False):
+        '''
+        根据全局配置开启本地存储(登录状态缓存、任务状态检查点)
+        :params daemonMode: 是否为常驻模式(常驻模式下不记录检查点)
+        '''
+        TenantDirectory.configure(config['cacheDir'], config['tenantCacheTTL'])
+        if not config['cacheDir']:
+            return
+        if config['sessionCache']:
+            SignTask.sessionCache = SessionCache(
+                config['cacheDir'], config['sessionCacheTTL'], config['sessionCacheKey'])
+        if config['checkpoint'] and not daemonMode:
+            SignTask.checkpoint = RunCheckpoint(config['cacheDir'], config['checkpointTTL'])
+        if config['deadlineSchedule']:
+            SignTask.deadlineStore = DeadlineStore(config['cacheDir'])
+        if config['completionLedger']:
+            SignTask.ledger = CompletionLedger(config['cacheDir'])
+            SignTask.ledgerVerifyRate = float(config['completionLedgerVerify'])
+
     @ staticmethod
     def cleanSession(uuid=None):
         '''
@@ -257,6 +458,129 @@ class SignTask:
             SignTask.userSessions.pop(uuid, None)
 
 
+class TaskRunner:
+    '''
+    任务执行器: 按用户分批, 交给任务调度器执行(包括失败重试)
+    '''
+
+    def __init__(self, taskList: list, config: dict, daemonMode: bool = False):
+        '''
+        :params taskList: 任务列表
+        :params config: 全局配置
+        :params daemonMode: 是否为常驻模式(常驻模式下保留登录状态)
+        '''
+        self.taskList = taskList
+        self.config = config
+        self.daemonMode = daemonMode
+        # 各用户待执行(状态码为0)的任务数, 归零时释放该用户的登录状态
+        self._pending = {}
+        for task in taskList:
+            if task.code == 0:
+                self._pending[task.uuid] = self._pending.get(task.uuid, 0) + 1
+        self._scheduler = TaskScheduler(
+            config['taskConcurrency'], config['hostConcurrency'],
+            {SceneCaptcha.lane: config['captchaConcurrency']})
+
+    def run(self):
+        '''
+        执行任务列表中待执行的任务
+        '''
+        # 按用户分批, 同一用户的任务在同一批中依次执行(只需登录一次)
+        # 截止时间早的用户先执行(截止时间根据之前学习到的任务时间窗口, 未知的排在最后)
+        # 各用户之间的随机延迟作为开始时间的偏移预先排好, 等待期间不阻塞其他任务
+        startOffset = 0
+        groups = [(self._groupDeadline(group), group) for group in self._groupTasks()]
+        groups.sort(key=lambda i: i[0])
+        for deadline, group in groups:
+            startOffset += RT.randomSeconds(group[0].config['delay'])
+            self._scheduler.submit(
+                group, group[0].config.get('schoolName', ''), startOffset, deadline)
+        LL.log(1, '已排好各用户的开始时间, 最后一个用户将在%.1f秒后开始' % startOffset)
+        # 执行任务(默认串行, 配置并发数后并发执行); 失败的任务会退避等待后重新入队
+        self._scheduler.run(self._runTaskGroup)
+        self._checkDeadlines()
+
+    def _groupTasks(self):
+        '''
+        将待执行的任务按用户(uuid)分组
+        :returns list[list[SignTask]]: 任务分组, 按各用户第一个任务在任务列表中的顺序排列
+        '''
+        groups = {}
+        for task in self.taskList:
+            if task.codeHead == 0:
+                groups.setdefault(task.uuid, []).append(task)
+        groups = list(groups.values())
+        # 同一用户的任务也按截止时间先后执行
+        for group in groups:
+            group.sort(key=lambda task: task.deadline or math.inf)
+        return groups
+
+    @staticmethod
+    def _groupDeadline(tasks: list):
+        '''
+        一组任务中最早的截止时间(用作调度优先级)
+        :returns float: 时间戳, 都未知时为math.inf
+        '''
+        return min((task.deadline or math.inf for task in tasks), default=math.inf)
+
+    def _checkDeadlines(self):
+        '''
+        检查错过时间窗口的任务(执行结束时已经超过截止时间且没有提前完成)
+        '''
+        now = time.time()
+        for task in self.taskList:
+            deadline = task.deadline
+            if not deadline or task.codeHead == 2 or task.code == 100:
+                continue
+            if (task.finishTime or now) > deadline:
+                task.missedDeadline = True
+                LL.log(2, "『%s』错过了任务的时间窗口(截止于%s)" % (
+                    task.username, time.strftime("%H:%M", time.localtime(deadline))))
+
+    def _runTaskGroup(self, tasks: list):
+        '''
+        依次执行同一用户的一组任务(由任务调度器调用)
+        '''
+        for task in tasks:
+            pending = task.code == 0
+            # 执行
+            task.execute()
+            # 清理无用session(该用户最后一个待执行的任务完成后立刻释放)
+            if pending and task.code != 0:
+                self._cleanSession(task.uuid)
+        # 失败的任务(未达到最大尝试次数)退避等待后重试
+        retryTasks = [i for i in tasks if i.codeHead == 0 and i.attempts < i.maxTry]
+        if retryTasks:
+            uuid = retryTasks[0].uuid
+            # 重试时重新登录
+            SignTask.cleanSession(uuid)
+            delay = max(self._retryDelay(max(i.attempts for i in retryTasks)),
+                        max(i.retryAfter for i in retryTasks))
+            LL.log(1, '『%s』有%d个任务失败, 将在%.1f秒后重试' %
+                   (retryTasks[0].username, len(retryTasks), delay))
+            self._scheduler.submit(
+                retryTasks, retryTasks[0].config.get('schoolName', ''), delay, self._groupDeadline(retryTasks))
+
+    def _retryDelay(self, attempts: int):
+        '''
+        计算重试前的退避时间(指数退避+随机抖动)
+        :params attempts: 已尝试次数
+        :returns float: 秒数
+        '''
+        base, cap = self.config['retryBackoff']
+        delay = min(float(cap), float(base) * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _cleanSession(self, uuid: str):
+        '''
+        登录状态内存释放: 用户的一个待执行任务执行完毕, 如果同用户已经没有未执行的任务, 则删除session
+        (常驻模式下保留session, 供之后的批次复用)
+        '''
+        self._pending[uuid] -= 1
+        if self._pending[uuid] <= 0 and not self.daemonMode:
+            SignTask.cleanSession(uuid)
+
+
 class MainHandler:
     def __init__(self, entranceType: str, event: dict = {}, context: dict = {}):
         '''
@@ -266,6 +590,10 @@ class MainHandler:
         self.entrance: str = entranceType
         self.event: dict = event
         self.context: dict = context
+        self._statusLock = threading.Lock()  # 保护任务状态统计(并发执行时任务状态在多个线程中修改)
+        # 本次运行的时钟(云函数热启动时进程会被复用, 不能使用导入模块时记录的时间)
+        self.clock: RunClock = RunClock()
+        LL.setClock(self.clock)
         # ==========参数初始化==========
         self.geneLogFile = True
         self.configDir = "config.yml"
@@ -279,10 +607,16 @@ class MainHandler:
             # 如果运行入口是『云函数』(不可写入文件)
             self.geneLogFile = False
         # ==========参数初始化==========
+        self.daemonMode: bool = bool(event.get("args", {}).get("daemon"))
+        self.workers: int = max(int(event.get("args", {}).get("workers") or 1), 1)
+        self.resume: bool = bool(event.get("args", {}).get("resume"))
         self.config: dict = self.loadConfig()
         self._setMsgOut()
         self._maxTry = self.config['maxTry']
-        self.taskList = [SignTask(u, self._maxTry)
+        SignTask.setupLocalStore(self.config, self.daemonMode)
+        CircuitBreaker.configure(*self.config['circuitBreaker'])
+        CaptchaPool.configure(*self.config['captchaPool'])
+        self.taskList = [SignTask(u, self._maxTry, self.clock)
                          for u in self.config['users']]
 
     def execute(self):
@@ -297,24 +631,32 @@ class MainHandler:
         }
         UserDefined.trigger(event, self.webhook)
         LL.log(1, "任务开始执行")
-        maxTry = self._maxTry
-        for tryTimes in range(1, maxTry+1):
-            '''自动重试'''
-            LL.log(1, '正在进行第%d轮尝试' % tryTimes)
-            for task in self.taskList:
-                '''遍历执行任务'''
-                # 执行
-                task.execute()
-                # 清理无用session
-                self._cleanSession(task.uuid)
-            # 清理session池
+        reqSession.resetStats()
+        CaptchaPool.resetStats()
+        if SignTask.checkpoint:
+            self._startCheckpoint()
+        if self.workers > 1:
+            # 多进程执行, 按用户分片
+            self._runShards()
+        else:
+            TaskRunner(self.taskList, self.config, self.daemonMode).run()
+        # 清理session池(常驻模式下保留, 供之后的批次复用)
+        if not self.daemonMode:
             SignTask.cleanSession()
+        if SignTask.checkpoint:
+            SignTask.checkpoint.finish()
+        if SignTask.deadlineStore:
+            SignTask.deadlineStore.flush()
+        LL.log(1, "本次运行共发出%(requests)d个请求, 新建%(connections)d个连接" % reqSession.stats)
+        if CaptchaPool.stats['count']:
+            LL.log(1, CaptchaPool.formatStats())
 
-        # 签到情况推送
-        LL.log(1, self.defaultFormatTitle + "\n" + self.defaultFormatMsg)
+        # 签到情况推送(汇总只生成一次)
+        title, msg = self.defaultFormatTitle, self.defaultFormatMsg
+        LL.log(1, title + "\n" + msg)
         sm = self.sendMsg
-        sm.send(msg=self.defaultFormatMsg, title=self.defaultFormatTitle, attachments=[(LL.msgOut.log.encode(encoding='utf-8'),
-                                                                                        TT.formatStartTime("LOG#t=%Y-%m-%d--%H-%M-%S##.txt"))])
+        sm.send(msg=msg, title=title, attachments=[(LL.msgOut.log.encode(encoding='utf-8'),
+                                                    self.clock.formatStartTime("LOG#t=%Y-%m-%d--%H-%M-%S##.txt"))])
         LL.log(1, '全局推送情况', sm.log_str)
         # 用户自定义函数触发
         event = {
@@ -325,18 +667,130 @@ class MainHandler:
         UserDefined.trigger(event, self.webhook)
         LL.log(1, "==========函数执行完毕==========")
 
+    def daemon(self):
+        '''
+        常驻模式: 根据各用户的taskTimeRange, 在用户进入执行时间的那一分钟执行其任务
+        (模块、配置、登录状态、连接池在各批次之间保持不变)
+        '''
+        LL.log(1, "以常驻模式运行, 将在各用户进入执行时间(taskTimeRange)时执行任务")
+        users = self.config['users']
+        lastMatched = [False] * len(users)  # 各用户上一分钟是否在执行时间内
+        lastMinute = int(time.time() // 60) - 1
+        lastDay = None
+        while True:
+            nowMinute = int(time.time() // 60)
+            # 逐分钟检查(上一批次执行时间较长时, 补查期间的每一分钟, 最多补查一天)
+            dueIndex = []
+            for minute in range(max(lastMinute + 1, nowMinute - 1440), nowMinute + 1):
+                day = time.localtime(minute * 60)[:3]
+                if day != lastDay:
+                    # 每天重新开始计算: 执行时间跨越零点(比如默认的全天)的用户每天也会执行一次
+                    lastMatched = [False] * len(users)
+                    lastDay = day
+                for i, user in enumerate(users):
+                    matched = TT.isInTimeList(user['taskTimeRange'], minute * 60)
+                    if matched and not lastMatched[i] and i not in dueIndex:
+                        dueIndex.append(i)
+                    lastMatched[i] = matched
+            lastMinute = nowMinute
+            if dueIndex:
+                self._dispatch([users[i] for i in dueIndex], lastMinute * 60)
+            # 等待到下一个可能有用户进入执行时间的分钟
+            # (已在执行时间内的用户需要逐分钟检查, 以便发现执行时间段的结束)
+            wakeTime = (lastMinute + 1) * 60
+            if not any(lastMatched):
+                fireTimes = [TT.nextFireTime(u['taskTimeRange'], lastMinute * 60) for u in users]
+                fireTimes = [i for i in fireTimes if i is not None]
+                wakeTime = min(fireTimes) if fireTimes else wakeTime + 86400
+                LL.log(1, "下一批任务将在%s执行" % time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(wakeTime)))
+            time.sleep(max(wakeTime - time.time(), 0) + 0.01)
+
+    def _dispatch(self, users: list, taskTime: float):
+        '''
+        常驻模式: 执行一批到期用户的任务
+        :params users: 到期的用户配置
+        :params taskTime: 到期时间
+        '''
+        SignTask.runId += 1
+        # 每批任务使用新的时钟(同时清空上一批次的日志, 汇总推送时作为附件发送的是本批次的日志)
+        self.clock = RunClock(taskTime=taskTime)
+        LL.setClock(self.clock)
+        LL.log(1, f"==========常驻模式: 第{SignTask.runId}批任务({len(users)}个)开始执行==========")
+        for user in users:
+            self._randomizeLocation(user)
+        self.taskList = [SignTask(u, self._maxTry, self.clock) for u in users]
+        try:
+            self.execute()
+        except Exception as e:
+            LL.log(3, f"常驻模式: 本批任务执行出错[{e}]\n{traceback.format_exc()}")
+
     def formatMsg(self, pattern: str = ""):
         return ST.stringFormating(pattern, self.webhook)
 
-    def _cleanSession(self, uuid: str):
+    def _startCheckpoint(self):
         '''
-        登录状态内存释放: 如果同用户还有没有未执行的任务, 则删除session
+        开始记录检查点; 如果是恢复运行(--resume), 先根据上次运行的检查点跳过已经完成/跳过的任务
         '''
-        for i in self.taskList:
-            if i.code == 0 and i.uuid == uuid:
-                break
-        else:
-            SignTask.cleanSession(uuid)
+        checkpoint = SignTask.checkpoint
+        date = time.strftime("%Y-%m-%d", time.localtime(self.clock.taskTime))
+        last = checkpoint.load(date) if self.resume else None
+        if not last:
+            if self.resume:
+                LL.log(1, "没有找到未完成的运行, 将执行全部任务")
+            checkpoint.start(self.clock.startTime, date)
+            return
+        startTime, states = last
+        restored = 0
+        for task in self.taskList:
+            state = states.get(task.taskKey)
+            if task.codeHead == 0 and state and int(state['code']/100) in (1, 2):
+                task.code = state['code']
+                task.attempts = state['attempts']
+                task.msg = state['msg']
+                restored += 1
+        LL.log(1, "恢复%s开始的运行: %d个任务已在上次运行中完成/跳过, 只执行剩余的任务" % (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(startTime)), restored))
+
+    def _runShards(self):
+        '''
+        多进程执行: 按uuid将用户分配到各工作进程(同一用户的任务在同一进程中), 各进程执行完后将任务状态传回主进程
+        '''
+        shards = [[] for _ in range(self.workers)]
+        for index, task in enumerate(self.taskList):
+            if task.codeHead == 0:
+                shards[int(task.uuid, 16) % self.workers].append(
+                    (index, task.config))
+        shards = [i for i in shards if i]
+        if not shards:
+            # 没有等待执行的任务(比如都不在执行时间内, 或者恢复运行时都已完成)
+            LL.log(1, "没有需要执行的任务, 不启动工作进程")
+            return
+        LL.log(1, f"以多进程模式执行任务({len(shards)}个工作进程)")
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(_runShard, self.config, shard, self.clock, self.daemonMode)
+                       for shard in shards]
+            for shard, future in zip(shards, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    LL.log(3, f"工作进程出错[{e}]\n{traceback.format_exc()}")
+                    for index, _ in shard:
+                        task = self.taskList[index]
+                        task.code = 300
+                        task.msg = f"工作进程出错[{e}]"
+                    continue
+                # 合并工作进程的日志(日志文件和日志附件中包含全部任务的日志)
+                with LL._lock:
+                    LL.msgOut.append(result['log'])
+                    LL.log_list.extend(result['logList'])
+                # 根据工作进程传回的webhook更新任务状态
+                for index, webhook in result['tasks']:
+                    task = self.taskList[index]
+                    task.code = webhook['statusCode']
+                    task.msg = webhook['msg']
+                    task.attempts = webhook['attempts']
+                    task.missedDeadline = webhook['missedDeadline']
 
     def _setMsgOut(self):
         '''
@@ -346,7 +800,7 @@ class MainHandler:
         if self.geneLogFile:
             logDir = self.config.get('logDir')
             if type(logDir) == str:
-                logDir = os.path.join(logDir, TT.formatStartTime(
+                logDir = os.path.join(logDir, self.clock.formatStartTime(
                     "LOG#t=%Y-%m-%d--%H-%M-%S##.txt"))
                 LL.msgOut.setFileOut(logDir)
                 return
@@ -381,7 +835,23 @@ class MainHandler:
         defaultConfig = {
             'delay': (5, 10),
             'locationOffsetRange': 50,
-            "shuffleTask": False
+            "shuffleTask": False,
+            'taskConcurrency': 1,
+            'hostConcurrency': 0,
+            'captchaConcurrency': 1,
+            'retryBackoff': (10, 300),
+            'circuitBreaker': (5, 60),
+            'captchaPool': (0, 4),
+            'cacheDir': "_cache/",
+            'sessionCache': False,
+            'sessionCacheTTL': 21600,
+            'sessionCacheKey': "",
+            'checkpoint': True,
+            'checkpointTTL': 21600,
+            'completionLedger': False,
+            'completionLedgerVerify': 0,
+            'deadlineSchedule': True,
+            'tenantCacheTTL': 86400,
         }
         defaultConfig.update(config)
         config.update(defaultConfig)
@@ -423,14 +893,56 @@ class MainHandler:
 
             # 坐标随机偏移
             user['global_locationOffsetRange'] = config['locationOffsetRange']
-            if 'lon' in user and 'lat' in user:
-                user['lon'], user['lat'] = RT.locationOffset(
-                    user['lon'], user['lat'], config['locationOffsetRange'])
+            self._randomizeLocation(user)
         return config
 
+    @staticmethod
+    def _randomizeLocation(user: dict):
+        '''
+        用户坐标随机偏移(偏移不会累积, 可以重复调用)
+        '''
+        if 'lon' in user and 'lat' in user:
+            user['lon'], user['lat'] = RT.locationOffset(
+                user['lon'], user['lat'], user['global_locationOffsetRange'])
+
+    @property
+    def taskList(self):
+        return self._taskList
+
+    @taskList.setter
+    def taskList(self, tasks: list):
+        '''设置任务列表, 并重新统计任务状态(之后任务状态变化时增量更新)'''
+        with self._statusLock:
+            self._taskList = tasks
+            self._codeCount = [0]*SignTask.codeHeadCounts
+            self._missedCount = 0
+            for task in tasks:
+                self._codeCount[task.codeHead] += 1
+                self._missedCount += bool(task.missedDeadline)
+                task.statusListener = self._onTaskStatus
+            self._webhook = None
+
+    def _onTaskStatus(self, task, name, old, new):
+        '''任务状态监听函数: 增量更新任务状态统计, 并使webhook缓存失效'''
+        with self._statusLock:
+            if name == 'code':
+                self._codeCount[int(old/100)] -= 1
+                self._codeCount[int(new/100)] += 1
+            elif name == 'missedDeadline':
+                self._missedCount += bool(new) - bool(old)
+            self._webhook = None
+
     @property
     def webhook(self):
-        codecount = self.codeCount
+        '''全局任务状态(任务状态不变时复用同一份统计, 只有usedTime每次更新)'''
+        with self._statusLock:
+            if self._webhook is None:
+                self._webhook = self._buildWebhook()
+            webhook = self._webhook
+        return dict(webhook, usedTime=self.clock.executionSeconds())
+
+    def _buildWebhook(self):
+        codecount = self._codeCount
         return {
             "taskcount_all": sum(codecount),  # 全部任务数
             "taskcount_todo": codecount[0],  # 待命任务数
@@ -440,10 +952,12 @@ class MainHandler:
             "taskcount_notFound": codecount[4],  # 缺失任务数(没有找到相关任务)
             # 被执行任务数(没有被跳过的任务)
             "taskcount_executed": sum(codecount) - codecount[2],
+            # 错过时间窗口的任务数
+            "taskcount_missed": self._missedCount,
 
             "scriptVersion": LL.prefix,  # 脚本版本
-            "runTime": TT.formatStartTime(),  # 脚本启动时间(%Y-%m-%d %H:%M:%S格式)
-            "usedTime": TT.executionSeconds(),  # 运行消耗时间(浮点数, 单位:秒)
+            "runTime": self.clock.formatStartTime(),  # 本次运行开始时间(%Y-%m-%d %H:%M:%S格式)
+            "usedTime": self.clock.executionSeconds(),  # 本次运行消耗时间(浮点数, 单位:秒)
 
             # 一个列表, 包含所有任务的webhook参数
             "taskWebhook": [i.webhook for i in self.taskList],
@@ -459,20 +973,20 @@ class MainHandler:
         for i in self.taskList:
             if i.codeHead != 2:
                 userMsg.append(i.defaultFormatMsg)
-        return self.formatMsg("\n".join([
-            "\n".join(userMsg),
+        lines = [
             "运行于{runTime}, 用时{usedTime}秒",
             "{taskcount_all}任务| {taskcount_todo}待命, {taskcount_done}完成, {taskcount_skip}跳过, {taskcount_error}错误, {taskcount_notFound}缺失"
-        ]))
+        ]
+        if self._missedCount:
+            lines.append("{taskcount_missed}个任务错过了时间窗口")
+        # 各任务的消息已经格式化过, 只需格式化汇总部分
+        return "\n".join(userMsg) + "\n" + self.formatMsg("\n".join(lines))
 
     @ property
     def codeCount(self):
         """状态码统计"""
-        codeList = [i.codeHead for i in self.taskList]
-        codeCount = [0]*SignTask.codeHeadCounts
-        for i in codeList:
-            codeCount[i] += 1
-        return codeCount
+        with self._statusLock:
+            return list(self._codeCount)
 
     @ property
     def sendMsg(self):
@@ -481,3 +995,40 @@ class MainHandler:
         :returns SendMessage
         '''
         return SendMessage(self.config.get('sendMessage'))
+
+
+def _runShard(config: dict, shard: list, clock: RunClock, daemonMode: bool = False):
+    '''
+    工作进程入口: 执行分配到本进程的任务
+    :params config: 全局配置
+    :params shard: [(任务在主进程任务列表中的位置, 用户配置), ...]
+    :params clock: 主进程的时钟
+    :returns dict: {"tasks": [(位置, 任务webhook), ...], "log": 本进程的输出, "logList": 本进程的日志}
+    '''
+    # 丢弃从主进程继承的日志和登录状态(不写入主进程的日志文件, 日志由主进程合并后写入)
+    LL.setClock(clock)
+    LL.msgOut.logFile = None
+    LL.msgOut.log = ""
+    LL.log_list.clear()
+    SignTask.cleanSession()
+    reqSession.resetShared()
+    reqSession.resetStats()
+    SignTask.setupLocalStore(config, daemonMode)
+    CircuitBreaker.configure(*config['circuitBreaker'])
+    CaptchaPool.configure(*config['captchaPool'])
+    taskList = [SignTask(userConfig, config['maxTry'], clock)
+                for _, userConfig in shard]
+    TaskRunner(taskList, config, daemonMode).run()
+    if not daemonMode:
+        SignTask.cleanSession()
+    if SignTask.deadlineStore:
+        SignTask.deadlineStore.flush()
+    LL.log(1, "工作进程共发出%(requests)d个请求, 新建%(connections)d个连接" % reqSession.stats)
+    if CaptchaPool.stats['count']:
+        LL.log(1, CaptchaPool.formatStats())
+    CaptchaPool.shutdown()
+    return {
+        "tasks": [(index, task.webhook) for (index, _), task in zip(shard, taskList)],
+        "log": LL.msgOut.log,
+        "logList": LL.log_list,
+    }
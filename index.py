@@ -75,8 +75,11 @@ try:
         "login/casLogin",
         "login/iapLogin",
         "login/RSALogin",
+        "login/formParser",
         "liteTools",
         "handler",
+        "taskScheduler",
+        "localStore",
         "checkRepositoryVersion",
     ):
         i = os.path.normpath(i)  # 路径适配系统
@@ -120,6 +123,25 @@ local：本地环境，如需使用外部配置文件需要加入该参数
 qinglong: 此参数代表环境为使用青龙面板，加入此参数将不会输出日志到文件，日志请从青龙面板的“日志管理”页面查看"""
         ),
     )
+    parser.add_argument(
+        "-d",
+        "--daemon",
+        action="store_true",
+        help="常驻运行: 脚本不退出, 每分钟检查各用户的taskTimeRange, 在用户进入执行时间时执行其任务",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="工作进程数: 大于1时按用户将任务分配到多个进程中执行(同一用户的任务在同一进程中)",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="恢复运行: 如果上次运行中途意外退出, 跳过上次已经完成/跳过的任务, 只执行剩余的任务",
+    )
     args = vars(parser.parse_args())
     return args
 
@@ -141,4 +163,8 @@ def main_handler(event, context):
 
 if __name__ == "__main__":
     """本地执行入口位置"""
-    MainHandler("__main__", {"args": getCommandArgs()}, {}).execute()
+    args = getCommandArgs()
+    if args["daemon"]:
+        MainHandler("__main__", {"args": args}, {}).daemon()
+    else:
+        MainHandler("__main__", {"args": args}, {}).execute()
@@ -1,8 +1,16 @@
 import time
 import traceback
+import threading
+import functools
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Sequence
 from io import TextIOWrapper
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from http.cookiejar import DefaultCookiePolicy
 import yaml
 import math
 import random
@@ -40,16 +48,186 @@ class reqResponse(requests.Response):
             raise Exception(f"响应内容以json格式解析失败({e})，响应内容:\n\n{self.text}")
 
 
+class _CountingPoolMixin:
+    """统计新建连接数的连接池(用于观察连接复用情况)"""
+
+    def _new_conn(self):
+        reqSession.stats["connections"] += 1
+        return super()._new_conn()
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledAdapter(HTTPAdapter):
+    """指定连接池大小和重试策略的HTTPAdapter"""
+
+    poolClasses = {"http": _CountingHTTPConnectionPool, "https": _CountingHTTPSConnectionPool}
+
+    def __init__(self, poolSize: int = 10, retries: int = 3):
+        """
+        :params poolSize: 每个域名保持的连接数
+        :params retries: 重试次数(连接失败时所有请求都会重试; 读取失败和502/503/504只重试GET等幂等请求, 不会重复提交表单)
+        """
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        super().__init__(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = PooledAdapter.poolClasses
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        if hasattr(manager, "pool_classes_by_scheme"):
+            manager.pool_classes_by_scheme = PooledAdapter.poolClasses
+        return manager
+
+
 class reqSession(requests.Session):
     """requests.Session的子类"""
 
-    def request(self, *args, **kwargs):
-        """增添了请求的默认超时时间, 将返回值转换为reqResponse"""
+    poolSize = 10  # 每个域名保持的连接数
+    retries = 3  # 重试次数
+    stats = {"requests": 0, "connections": 0}  # 请求数和新建连接数统计
+    _shared = None  # 进程内共享的Session
+    _sharedLock = threading.Lock()
+
+    def __init__(self):
+        super().__init__()
+        adapter = PooledAdapter(reqSession.poolSize, reqSession.retries)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    @staticmethod
+    def shared():
+        """
+        进程内共享的Session(不保存cookies), 供消息推送、百度地图、图片下载、代理检查等模块级的请求使用, 同一域名的连接可以复用
+        """
+        with reqSession._sharedLock:
+            if reqSession._shared is None:
+                session = reqSession()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                reqSession._shared = session
+            return reqSession._shared
+
+    @staticmethod
+    def resetShared():
+        """丢弃共享的Session(比如在子进程中, 不能使用从父进程继承的连接)"""
+        with reqSession._sharedLock:
+            reqSession._shared = None
+
+    @staticmethod
+    def resetStats():
+        reqSession.stats = {"requests": 0, "connections": 0}
+
+    def request(self, method, url, *args, **kwargs):
+        """增添了请求的默认超时时间, 将返回值转换为reqResponse; 请求经过所在域名的熔断器"""
         kwargs.setdefault("timeout", (10, 30))
-        res = super(reqSession, self).request(*args, **kwargs)
+        reqSession.stats["requests"] += 1
+        # 熔断器按域名(以及使用的代理)区分
+        host = parse.urlparse(url).netloc
+        proxy = (kwargs.get("proxies") or self.proxies or {}).get(url.split(":", 1)[0])
+        if proxy:
+            host += f"(代理{proxy})"
+        CircuitBreaker.check(host)
+        try:
+            res = super(reqSession, self).request(method, url, *args, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            CircuitBreaker.record(host, False)
+            raise
+        except Exception as e:
+            # 响应钩子(比如Utils.checkStatus)抛出的异常
+            res = getattr(e, "response", None)
+            CircuitBreaker.record(
+                host, res is None or not CircuitBreaker.isFailureStatus(res.status_code))
+            raise
+        CircuitBreaker.record(
+            host, not CircuitBreaker.isFailureStatus(res.status_code))
         return reqResponse(res)
 
 
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态, 请求没有发出(消耗一次任务的尝试次数, 至少等待retryAfter秒后重试)"""
+
+    def __init__(self, host: str, retryAfter: float):
+        self.host = host
+        self.retryAfter = retryAfter
+
+    def __str__(self):
+        return f"『{self.host}』暂时无法访问(熔断中), {self.retryAfter:.0f}秒后重试"
+
+
+class LoginUrlError(Exception):
+    """登录地址可能已经失效(登录页面中没有登录表单、意外的跳转或状态码), 下次登录时需要重新获取登录地址"""
+
+
+class CircuitBreaker:
+    """
+    按域名熔断: 同一域名连续出现多次失败(418/5xx/超时/连接失败)后, 在冷却时间内不再发出请求, 直接抛出CircuitOpenError
+    冷却时间过后放行一个试探请求, 成功则恢复, 失败则继续熔断
+    """
+
+    threshold = 5  # 连续失败多少次后熔断(为0时不熔断)
+    coolDown = 60  # 熔断冷却时间(秒)
+    _hosts = {}  # {域名: {"failures": 连续失败次数, "openUntil": 熔断结束时间(0代表未熔断), "probing": 是否有试探请求正在进行}}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(threshold: int = 5, coolDown: float = 60):
+        CircuitBreaker.threshold = int(threshold)
+        CircuitBreaker.coolDown = float(coolDown)
+
+    @staticmethod
+    def isFailureStatus(statusCode: int):
+        """状态码是否代表服务端故障(418代表IP被屏蔽)"""
+        return statusCode == 418 or statusCode >= 500
+
+    @staticmethod
+    def check(host: str):
+        """发出请求前检查, 熔断中则抛出CircuitOpenError"""
+        if CircuitBreaker.threshold <= 0:
+            return
+        with CircuitBreaker._lock:
+            state = CircuitBreaker._hosts.get(host)
+            if not state or not state["openUntil"]:
+                return
+            now = time.time()
+            if now < state["openUntil"]:
+                raise CircuitOpenError(host, state["openUntil"] - now)
+            if state["probing"]:
+                # 已经有试探请求正在进行
+                raise CircuitOpenError(host, min(CircuitBreaker.coolDown, 10))
+            state["probing"] = True
+
+    @staticmethod
+    def record(host: str, success: bool):
+        """记录请求结果"""
+        if CircuitBreaker.threshold <= 0:
+            return
+        with CircuitBreaker._lock:
+            state = CircuitBreaker._hosts.setdefault(
+                host, {"failures": 0, "openUntil": 0, "probing": False})
+            if success:
+                if state["openUntil"]:
+                    LL.log(1, f"『{host}』恢复访问, 熔断结束")
+                state.update(failures=0, openUntil=0, probing=False)
+                return
+            state["failures"] += 1
+            if state["probing"] or state["failures"] >= CircuitBreaker.threshold:
+                state.update(openUntil=time.time() + CircuitBreaker.coolDown, probing=False)
+                LL.log(2, f"『{host}』连续{state['failures']}次请求失败, 熔断{CircuitBreaker.coolDown:.0f}秒")
+
+
 class FileOut:
     """
     代替stdout和stderr, 使print同时输出到文件和终端中。
@@ -118,6 +296,15 @@ class FileOut:
         FileOut.stdout.write(str_)
         self.flush()
 
+    def append(self, str_: str):
+        """
+        追加已经在其他地方输出到终端的内容(比如工作进程的日志): 只记录到log字符串和日志文件中
+        """
+        self.log += str_
+        if self.logFile:
+            self.logFile.write(str_)
+            self.logFile.flush()
+
     def flush(self):
         """刷新缓冲区"""
         self.stdout.flush()
@@ -162,6 +349,92 @@ class TaskError(Exception):
         return msg
 
 
+class TimeRange:
+    """
+    编译后的时间限定字符串(形如"1,2,3 1,2,3 1,2,3 1,2,3 1,2,3", 各位置代表"周(星期几) 月 日 时 分")
+    每个位置被编译为一个整数位掩码(第n位为1代表n在范围内), 匹配时只需要位运算
+    """
+
+    pattern = re.compile(r"^(?:\d+-?\d*(?:,\d+-?\d*)* ){4}(?:\d+-?\d*(?:,\d+-?\d*)*)$")
+    searchDays = 366 * 28 + 1  # nextFireTime最多向后查找的天数(星期与日期的组合28年一循环)
+
+    def __init__(self, timeRange: str):
+        """
+        :params timeRange: 时间限定字符串
+        """
+        if type(timeRange) != str:
+            raise TypeError(f"timeRange(时间限定字符串)应该是字符串, 而不是『{type(timeRange)}』")
+        if not TimeRange.pattern.match(timeRange):
+            raise Exception(f"『{timeRange}』不是正确格式的时间限定字符串")
+        self.timeRange = timeRange
+        try:
+            self.masks = tuple(TimeRange._fieldMask(i) for i in timeRange.split(" "))
+        except ValueError:
+            raise Exception(f"『{timeRange}』不是正确格式的时间限定字符串")
+
+    @staticmethod
+    def _fieldMask(field: str):
+        """将"3,4-6"形式的字符串转为位掩码"""
+        mask = 0
+        for item in field.split(","):
+            if "-" in item:
+                a, b = item.split("-")
+                a, b = int(a), int(b)
+                if a > b:
+                    a, b = b, a
+                mask |= (1 << (b + 1)) - (1 << a)
+            else:
+                mask |= 1 << int(item)
+        return mask
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def compile(timeRange: str):
+        """
+        编译时间限定字符串(以字符串为键缓存编译结果)
+        :returns TimeRange
+        """
+        return TimeRange(timeRange)
+
+    def matchStruct(self, t: time.struct_time):
+        """判断struct_time是否匹配"""
+        week, month, day, hour, minute = self.masks
+        return bool(
+            (week >> (t.tm_wday + 1)) & 1
+            and (month >> t.tm_mon) & 1
+            and (day >> t.tm_mday) & 1
+            and (hour >> t.tm_hour) & 1
+            and (minute >> t.tm_min) & 1
+        )
+
+    def match(self, nowTime: float):
+        """判断时间戳是否匹配"""
+        return self.matchStruct(time.localtime(nowTime))
+
+    def nextFireTime(self, after: float):
+        """
+        查询匹配的下一分钟
+        :params after: 时间戳
+        :returns float|None: 晚于after的第一个匹配的整分钟时间戳(找不到时返回None)
+        """
+        week, month, day, hour, minute = self.masks
+        start = time.localtime(after - after % 60 + 60)
+        date = datetime.date(start.tm_year, start.tm_mon, start.tm_mday)
+        for dayOffset in range(TimeRange.searchDays):
+            d = date + datetime.timedelta(days=dayOffset)
+            if not ((week >> (d.weekday() + 1)) & 1 and (month >> d.month) & 1 and (day >> d.day) & 1):
+                continue
+            firstDay = dayOffset == 0
+            for h in range(start.tm_hour if firstDay else 0, 24):
+                if not (hour >> h) & 1:
+                    continue
+                firstHour = firstDay and h == start.tm_hour
+                for m in range(start.tm_min if firstHour else 0, 60):
+                    if (minute >> m) & 1:
+                        return time.mktime((d.year, d.month, d.day, h, m, 0, 0, 0, -1))
+        return None
+
+
 class TT:
     """time Tools"""
 
@@ -172,83 +445,112 @@ class TT:
         return time.strftime(format, time.localtime(TT.startTime))
 
     @staticmethod
-    def isInTimeList(timeRanges, nowTime: float = startTime):
+    def _timeRangeList(timeRanges):
+        """将时间限定字符串(列表)格式化为列表(纯字符串时跳过超级字符串的格式化)"""
+        if isinstance(timeRanges, str):
+            return [timeRanges]
+        if isinstance(timeRanges, (list, tuple)) and all(type(i) == str for i in timeRanges):
+            return timeRanges
+        return DT.formatStrList(timeRanges)
+
+    @staticmethod
+    def isInTimeList(timeRanges, nowTime: float = None):
         """判断(在列表中)是否有时间限定字符串是否匹配时间
         :params timeRages: 时间限定字符串列表。
             :时间限定字符串是形如"1,2,3 1,2,3 1,2,3 1,2,3 1,2,3"形式的字符串。
             :其各位置代表"周(星期几) 月 日 时 分", 周/月/日皆以1开始。
             :可以以"2-5"形式代表时间范围。比如"3,4-6"就等于"3,4,5,6"
-        :params nowTime: 时间戳
+        :params nowTime: 时间戳(默认为脚本启动时间)
         :return bool: 在列表中是否有时间限定字符串匹配时间
         """
-        timeRanges = DT.formatStrList(timeRanges)
-        for i in timeRanges:
-            if TT.isInTime(i, nowTime):
+        nowTime = time.localtime(TT.startTime if nowTime is None else nowTime)
+        for i in TT._timeRangeList(timeRanges):
+            if TimeRange.compile(i).matchStruct(nowTime):
                 return True
-            else:
-                pass
-        else:
-            return False
+        return False
 
     @staticmethod
-    def isInTime(timeRange: str, nowTime: float = startTime):
+    def isInTime(timeRange: str, nowTime: float = None):
         """
         判断时间限定字符串是否匹配时间
         :params timeRage: 时间限定字符串。
             :是形如"1,2,3 1,2,3 1,2,3 1,2,3 1,2,3"形式的字符串。
             :其各位置代表"周(星期几) 月 日 时 分", 周/月/日皆以1开始。
             :可以以"2-5"形式代表时间范围。比如"3,4-6"就等于"3,4,5,6"
-        :params nowTime: 时间戳
+        :params nowTime: 时间戳(默认为脚本启动时间)
         :return bool: 时间限定字符串是否匹配时间
         """
-        # 判断类型
         if type(timeRange) != str:
             raise TypeError(f"timeRange(时间限定字符串)应该是字符串, 而不是『{type(timeRange)}』")
-        # 判断格式
-        if not re.match(
-            r"^(?:\d+-?\d*(?:,\d+-?\d*)* ){4}(?:\d+-?\d*(?:,\d+-?\d*)*)$", timeRange
-        ):
-            raise Exception(f"『{timeRange}』不是正确格式的时间限定字符串")
-        # 将时间范围格式化
+        return TimeRange.compile(timeRange).match(TT.startTime if nowTime is None else nowTime)
 
-        def formating(m):
-            """匹配a-e样式的字符串替换为a,b,c,d,e样式"""
-            a = int(m.group(1))
-            b = int(m.group(2))
-            if a > b:
-                a, b = b, a
-            return ",".join([str(i) for i in range(a, b)] + [str(b)])
-
-        timeRange = re.sub(r"(\d*)-(\d*)", formating, timeRange)
-        # 将字符串转为二维整数数组
-        timeRange = timeRange.split(" ")
-        timeRange = [[int(j) for j in i.split(",")] for i in timeRange]
-        # 将当前时间格式化为"周 月 日 时 分"
-        nowTime = tuple(time.localtime(nowTime))
-        nowTime = (nowTime[6] + 1, nowTime[1], nowTime[2], nowTime[3], nowTime[4])
-        for a, b in zip(nowTime, timeRange):
-            if a not in b:
-                return False
-            else:
-                pass
-        else:
-            return True
+    @staticmethod
+    def nextFireTime(timeRanges, after: float):
+        """
+        查询时间限定字符串(列表)匹配的下一分钟
+        :params timeRanges: 时间限定字符串(列表)
+        :params after: 时间戳
+        :returns float|None: 晚于after的第一个匹配的整分钟时间戳(找不到时返回None)
+        """
+        fireTimes = [TimeRange.compile(i).nextFireTime(after) for i in TT._timeRangeList(timeRanges)]
+        fireTimes = [i for i in fireTimes if i is not None]
+        return min(fireTimes) if fireTimes else None
 
     @staticmethod
     def executionSeconds(round_: int = 2):
         return round(time.time() - TT.startTime, round_)
 
 
+class RunClock:
+    """
+    单次运行的时钟
+    TT.startTime是进程(模块导入)的启动时间, 云函数热启动时会复用进程, 所以每次运行都应该使用新的RunClock
+    """
+
+    def __init__(self, startTime: float = None, taskTime: float = None):
+        """
+        :params startTime: 本次运行的开始时间(默认为当前时间)
+        :params taskTime: 判断任务是否在执行时间(taskTimeRange)时使用的时间(默认为开始时间)
+        """
+        self.startTime: float = time.time() if startTime is None else startTime
+        self.taskTime: float = self.startTime if taskTime is None else taskTime
+
+    def formatStartTime(self, format: str = "%Y-%m-%d %H:%M:%S"):
+        return time.strftime(format, time.localtime(self.startTime))
+
+    def executionSeconds(self, round_: int = 2):
+        return round(time.time() - self.startTime, round_)
+
+    def isInTimeList(self, timeRanges):
+        """判断任务是否在执行时间, 见TT.isInTimeList"""
+        return TT.isInTimeList(timeRanges, self.taskTime)
+
+
 class LL:
     """lite log"""
 
     prefix = checkRepositoryVersion.getCodeVersion()
     startTime = TT.startTime
+    clock: RunClock = None  # 当前运行的时钟
     log_list = []
     printLevel = 0
     logTypeDisplay = ["debug", "info", "warn", "error", "critical"]
     msgOut: FileOut = FileOut()
     msgOut.start()
+    _lock = threading.RLock()  # 多线程执行任务时, 保证日志不会交错
+
+    @staticmethod
+    def setClock(clock: RunClock):
+        """
+        开始新一次运行: 日志时间改为相对于本次运行的开始时间
+        如果之前已经有运行(云函数热启动/常驻模式), 则清空之前运行的日志
+        """
+        with LL._lock:
+            if LL.clock is not None:
+                LL.msgOut.log = ""
+                LL.log_list.clear()
+            LL.clock = clock
+            LL.startTime = clock.startTime
 
     @staticmethod
     def formatLog(logType: str, args):
@@ -278,9 +580,10 @@ class LL:
         if not args:
             return
         logItem = LL.formatLog(logType, args)
-        LL.log_list.append(logItem)
-        if logType >= LL.printLevel:
-            print(LL.log2FormatStr(logItem))
+        with LL._lock:
+            LL.log_list.append(logItem)
+            if logType >= LL.printLevel:
+                print(LL.log2FormatStr(logItem))
 
     @staticmethod
     def getLog(level=0):
@@ -300,7 +603,8 @@ class LL:
         log = LL.getLog(level)
         if not os.path.isdir(dir):
             os.makedirs(dir)
-        dir = os.path.join(dir, TT.formatStartTime("LOG#t=%Y-%m-%d--%H-%M-%S##.txt"))
+        clock = LL.clock or TT
+        dir = os.path.join(dir, clock.formatStartTime("LOG#t=%Y-%m-%d--%H-%M-%S##.txt"))
         with open(dir, "w", encoding="utf-8") as f:
             f.write(log)
 
@@ -385,12 +689,12 @@ class CpdailyTools:
             "User-Agent": "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:50.0) Gecko/20100101 Firefox/50.0"
         }
         url = "https://feres.cpdaily.com/bower_components/baidumap/baidujsSdk@2.js"
-        res = requests.get(url, headers=headers, verify=False)
+        res = reqSession.shared().get(url, headers=headers, verify=False)
         baiduMap_ak = re.findall(r"ak=(\w*)", res.text)[0]
         # 用地址获取相应坐标
         url = f"http://api.map.baidu.com/geocoding/v3"
         params = {"output": "json", "address": address, "ak": baiduMap_ak}
-        res = requests.get(url, headers=headers, params=params, verify=False)
+        res = reqSession.shared().get(url, headers=headers, params=params, verify=False)
         res = res.json()
         lon = res["result"]["location"]["lng"]
         lat = res["result"]["location"]["lat"]
@@ -404,12 +708,12 @@ class CpdailyTools:
             "User-Agent": "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:50.0) Gecko/20100101 Firefox/50.0"
         }
         url = "https://feres.cpdaily.com/bower_components/baidumap/baidujsSdk@2.js"
-        res = requests.get(url, headers=headers, verify=False)
+        res = reqSession.shared().get(url, headers=headers, verify=False)
         baiduMap_ak = re.findall(r"ak=(\w*)", res.text)[0]
         # 用地址获取相应坐标
         url = f"http://api.map.baidu.com/reverse_geocoding/v3"
         params = {"output": "json", "location": "%f,%f" % (lon, lat), "ak": baiduMap_ak}
-        res = requests.get(url, headers=headers, params=params, verify=False)
+        res = reqSession.shared().get(url, headers=headers, params=params, verify=False)
         res = res.json()
         address = res["result"]["formatted_address"]
         return address
@@ -469,114 +773,187 @@ class CpdailyTools:
         signType: str = "attendance",
     ):
         """
-        图形验证码处理
+        图形验证码处理(见SceneCaptcha)
         :returns dict:用于更新表单(self.form)的字典(如果不需要验证码返回{}, 如果需要返回)
         """
-        error = None  # 如果发生异常进行重试, 则保留错误信息
-        headers = session.headers.copy()
-        # ====================检查是否需要验证码====================
-        if signType == "attendance":
-            have_cap = f"{host}wec-counselor-attendance-apps/student/attendance/checkValidation"
-        elif signType == "sign":
-            have_cap = f"{host}wec-counselor-sign-apps/stu/sign/checkValidation"
-        elif signType == "collector":
-            have_cap = (
-                f"{host}wec-counselor-collector-apps/stu/collector/checkValidation"
-            )
-        else:
+        return SceneCaptcha(host, session, deviceId, maxTry, signType).run()
+
+
+class SceneCaptcha:
+    """
+    图形验证码(物品验证码)处理的状态机
+    状态: check(检查是否需要验证码) → enter(进入验证码通道) → create(获取验证码) → recognize(识别) → validate(提交) → done
+    识别出错或提交被拒绝后进入wait状态, 等待结束后回到create
+    :feature: 等待期间让出任务调度器的执行位置(TaskScheduler.park), 其他用户的任务可以继续执行
+    :feature: 需要验证码的任务在单独的通道中处理验证码, 通道的并发数单独限制(captchaConcurrency)
+    """
+
+    lane = "captcha"  # 任务调度器中的验证码通道
+    boundary = "----WebKitFormBoundaryBlRdUZvbYBzP5FaF"
+    checkApis = {
+        "attendance": "wec-counselor-attendance-apps/student/attendance/checkValidation",
+        "sign": "wec-counselor-sign-apps/stu/sign/checkValidation",
+        "collector": "wec-counselor-collector-apps/stu/collector/checkValidation",
+    }
+    recognizeErrorWait = (5, 6)  # 识别出错后等待的秒数(刷新验证码)
+    rejectedWait = (16, 20)  # 提交被拒绝后等待的秒数(验证码获取间隔时间为15秒)
+
+    def __init__(
+        self,
+        host: str,
+        session: reqSession,
+        deviceId: str,
+        maxTry=3,
+        signType: str = "attendance",
+    ):
+        if signType not in SceneCaptcha.checkApis:
             raise Exception("未知signType")
-        data = {"deviceId": deviceId}
-        headers.update(
+        self.host = host
+        self.session = session
+        self.deviceId = deviceId
+        self.maxTry = maxTry
+        self.signType = signType
+        self.headers = session.headers.copy()
+        self.state = "check"
+        self.tries = 0  # 已获取验证码的次数
+        self.delay = 0  # wait状态下需要等待的秒数
+        self.error = None  # 如果发生异常进行重试, 则保留错误信息
+        self.haveCap_data = None  # 检查验证码的返回值
+        self.capCode = None  # 获取验证码的返回值
+        self.answerkey = None  # 识别结果
+        self.result = None  # 用于更新表单的字典
+
+    def run(self) -> dict:
+        """
+        执行状态机直到完成
+        :returns dict: 用于更新表单的字典(如果不需要验证码返回{})
+        """
+        from taskScheduler import TaskScheduler
+
+        try:
+            while self.state != "done":
+                if self.state == "enter":
+                    # 让出执行位置, 直到验证码通道有空位
+                    TaskScheduler.park(0, SceneCaptcha.lane)
+                    self.state = "create"
+                elif self.state == "wait":
+                    LL.log(0, "验证码处理暂停%.3f秒(期间执行其他任务)" % self.delay)
+                    TaskScheduler.park(self.delay, SceneCaptcha.lane)
+                    self.state = "create"
+                else:
+                    self.step()
+        finally:
+            TaskScheduler.leaveLane(SceneCaptcha.lane)
+        return self.result
+
+    def step(self):
+        """执行当前状态(check/create/recognize/validate)的一步"""
+        getattr(self, "_" + self.state)()
+
+    def _wait(self, timeRange: tuple):
+        """进入等待状态(已经达到最大尝试次数时不再等待)"""
+        if self.tries >= self.maxTry:
+            self._fail()
+        self.delay = RT.randomSeconds(timeRange)
+        self.state = "wait"
+
+    def _fail(self):
+        """重试次数达到上限"""
+        raise Exception(f"验证码处理失败, 错误信息: \n『{self.error}』")
+
+    def _check(self):
+        """检查是否需要验证码"""
+        data = {"deviceId": self.deviceId}
+        self.headers.update(
             {
                 "CpdailyStandAlone": "0",
                 "extension": "1",
                 "Content-Type": "application/json; charset=utf-8",
             }
         )
-        res = session.post(url=have_cap, data=json.dumps(data), headers=headers)
+        res = self.session.post(
+            url=self.host + SceneCaptcha.checkApis[self.signType],
+            data=json.dumps(data),
+            headers=self.headers,
+        )
         res = res.json()
-        haveCap_data = res["datas"]
-        LL.log(1, "检查是否需要填写验证码", haveCap_data)
-        if not haveCap_data["validation"]:
+        self.haveCap_data = res["datas"]
+        LL.log(1, "检查是否需要填写验证码", self.haveCap_data)
+        if not self.haveCap_data["validation"]:
             """如果不需要填写验证码, 则直接返回"""
-            return {}
-
-        for try_ in range(maxTry):
-            LL.log(1, f"正在进行第{try_+1}次验证码识别尝试")
-            # ====================获取验证码====================
-            headers.update(
-                {
-                    "Content-Type": "multipart/form-data; boundary=----WebKitFormBoundaryBlRdUZvbYBzP5FaF",
-                    "deviceId": deviceId,
-                }
-            )
-            url = f"{host}captcha-open-api/v1/captcha/create/scenesImage"
-            data = [
-                ("accountKey", haveCap_data["accountKey"]),
-                ("sceneCode", haveCap_data["sceneCode"]),
-                ("tenantId", haveCap_data["tenantId"]),
-                ("userId", haveCap_data["userId"]),
-            ]
-
-            res = session.post(
-                url=url,
-                data=MultipartEncoder(
-                    data, boundary="----WebKitFormBoundaryBlRdUZvbYBzP5FaF"
-                ),
-                headers=headers,
-            )
-            capCode = res.json()
-            LL.log(1, "获取验证码", capCode)
-
-            # ====================识别验证码====================
-
-            event = {
-                "msg": f"请求图片验证码识别",  # 触发消息
-                "from": "liteTools.handleCaptcha",  # 触发位置
-                "code": 300,
+            self.result = {}
+            self.state = "done"
+        else:
+            self.state = "enter"
+
+    def _formData(self, extra: list = ()):
+        """验证码接口的表单"""
+        data = [
+            ("accountKey", self.haveCap_data["accountKey"]),
+            ("sceneCode", self.haveCap_data["sceneCode"]),
+            ("tenantId", self.haveCap_data["tenantId"]),
+            ("userId", self.haveCap_data["userId"]),
+        ]
+        data.extend(extra)
+        return MultipartEncoder(data, boundary=SceneCaptcha.boundary)
+
+    def _create(self):
+        """获取验证码"""
+        if self.tries >= self.maxTry:
+            self._fail()
+        self.tries += 1
+        LL.log(1, f"正在进行第{self.tries}次验证码识别尝试")
+        self.headers.update(
+            {
+                "Content-Type": f"multipart/form-data; boundary={SceneCaptcha.boundary}",
+                "deviceId": self.deviceId,
             }
-            handleCaptchaResult = UserDefined.trigger(
-                event, context={"capcode": capCode}
-            )
-
-            hc_err = handleCaptchaResult["exceptError"]
-            if hc_err:
-                """如果报错"""
-                error = hc_err
-                LL.log(3, f"验证码识别出错: {hc_err}")
-                RT.randomSleep(timeRange=(5, 6))  # 刷新验证码
-                continue
-            else:
-                """如果执行正常"""
-                answerkey = handleCaptchaResult["result"]
-
-            # ====================提交验证码====================
-            url = f"{host}captcha-open-api/v1/captcha/validate/scenesImage"
-            data = [
-                ("accountKey", haveCap_data["accountKey"]),
-                ("sceneCode", haveCap_data["sceneCode"]),
-                ("tenantId", haveCap_data["tenantId"]),
-                ("userId", haveCap_data["userId"]),
-                ("scenesImageCode", capCode["result"]["code"]),
-            ]
-            data.extend([("scenesImageCodes", i) for i in answerkey])
-            res = session.post(
-                url=url,
-                data=MultipartEncoder(
-                    data, boundary="----WebKitFormBoundaryBlRdUZvbYBzP5FaF"
-                ),
-                headers=headers,
-            )
-            res = res.json()
-            LL.log(1, "提交验证码", res)
-            if not res["result"]:
-                LL.log(3, "验证码提交出错")
-                RT.randomSleep(timeRange=(16, 20))  # 验证码获取间隔时间为15秒
-                continue
-            return {"ticket": res["result"]}
+        )
+        res = self.session.post(
+            url=f"{self.host}captcha-open-api/v1/captcha/create/scenesImage",
+            data=self._formData(),
+            headers=self.headers,
+        )
+        self.capCode = res.json()
+        LL.log(1, "获取验证码", self.capCode)
+        self.state = "recognize"
+
+    def _recognize(self):
+        """识别验证码(调用userDefined.py中的识别函数)"""
+        event = {
+            "msg": f"请求图片验证码识别",  # 触发消息
+            "from": "liteTools.handleCaptcha",  # 触发位置
+            "code": 300,
+        }
+        handleCaptchaResult = UserDefined.trigger(event, context={"capcode": self.capCode})
+        hc_err = handleCaptchaResult["exceptError"]
+        if hc_err:
+            """如果报错"""
+            self.error = hc_err
+            LL.log(3, f"验证码识别出错: {hc_err}")
+            self._wait(SceneCaptcha.recognizeErrorWait)
         else:
-            """重试次数达到上限"""
-            raise Exception(f"验证码处理失败, 错误信息: \n『{error}』")
+            """如果执行正常"""
+            self.answerkey = handleCaptchaResult["result"]
+            self.state = "validate"
+
+    def _validate(self):
+        """提交验证码"""
+        extra = [("scenesImageCode", self.capCode["result"]["code"])]
+        extra.extend([("scenesImageCodes", i) for i in self.answerkey])
+        res = self.session.post(
+            url=f"{self.host}captcha-open-api/v1/captcha/validate/scenesImage",
+            data=self._formData(extra),
+            headers=self.headers,
+        )
+        res = res.json()
+        LL.log(1, "提交验证码", res)
+        if not res["result"]:
+            LL.log(3, "验证码提交出错")
+            self._wait(SceneCaptcha.rejectedWait)
+            return
+        self.result = {"ticket": res["result"]}
+        self.state = "done"
 
 
 class NT:
@@ -589,7 +966,7 @@ class NT:
         :return 如果代理正常返回0, 代理异常返回1
         """
         try:
-            requests.get(url="https://www.baidu.com/", proxies=proxies, timeout=10)
+            reqSession.shared().get(url="https://www.baidu.com/", proxies=proxies, timeout=10)
         except requests.RequestException as e:
             return 1
         return 0
@@ -735,7 +1112,7 @@ class RT:
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.74 Safari/537.36 Edg/99.0.1150.46",
             }
             try:
-                response = requests.get(url=url, headers=headers, timeout=(10, 20))
+                response = reqSession.shared().get(url=url, headers=headers, timeout=(10, 20))
             except requests.exceptions.ConnectionError as e:
                 LL.log(
                     1,
@@ -793,13 +1170,18 @@ class RT:
         raise Exception("图片列表中没有可用图片")
 
     @staticmethod
-    def randomSleep(timeRange: tuple = (5, 7)):
-        """随机暂停一段时间"""
+    def randomSeconds(timeRange: tuple = (5, 7)):
+        """在时间范围内随机选取一个秒数"""
         if len(timeRange) != 2:
             raise Exception("时间范围应包含开始与结束，列表长度应为2")
         a = timeRange[0]
         b = timeRange[1]
-        sleepTime = random.uniform(a, b)
+        return random.uniform(a, b)
+
+    @staticmethod
+    def randomSleep(timeRange: tuple = (5, 7)):
+        """随机暂停一段时间"""
+        sleepTime = RT.randomSeconds(timeRange)
         LL.log(0, "程序正在暂停%.3f秒" % sleepTime)
         time.sleep(sleepTime)
 
@@ -832,6 +1214,25 @@ class DT:
         with open(ymlDir, "w", encoding="utf-8") as f:
             yaml.dump(item, f, allow_unicode=True)
 
+    @staticmethod
+    def loadJson(jsonDir, default=None):
+        """读取json文件, 文件不存在或者解析失败时返回default"""
+        try:
+            with open(jsonDir, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def writeJson(item, jsonDir):
+        """写入json文件(先写入临时文件再替换, 避免写入中断导致文件损坏)"""
+        jsonDir = os.path.abspath(jsonDir)
+        os.makedirs(os.path.dirname(jsonDir), exist_ok=True)
+        tempDir = "%s.%d.tmp" % (jsonDir, os.getpid())
+        with open(tempDir, "w", encoding="utf-8") as f:
+            json.dump(item, f, ensure_ascii=False)
+        os.replace(tempDir, jsonDir)
+
     @staticmethod
     def formatStrList(item, returnSuperStr=False):
         """字符串序列或字符串 格式化为 字符串列表。
@@ -883,6 +1284,23 @@ class CT:
         """去掉填充字符"""
         return text[: -ord(text[-1])]
 
+    @staticmethod
+    def aesEncrypt(data: bytes, password: str):
+        """使用口令加密字节串(AES-GCM, 密钥为口令的sha256), 返回base64字符串"""
+        key = hashlib.sha256(password.encode(CT.charset)).digest()
+        cipher = AES.new(key, AES.MODE_GCM)
+        text, tag = cipher.encrypt_and_digest(data)
+        return base64.b64encode(cipher.nonce + tag + text).decode(CT.charset)
+
+    @staticmethod
+    def aesDecrypt(text: str, password: str):
+        """解密aesEncrypt加密的字符串, 口令错误或者数据被篡改时抛出ValueError"""
+        key = hashlib.sha256(password.encode(CT.charset)).digest()
+        data = base64.b64decode(text)
+        nonce, tag, data = data[:16], data[16:32], data[32:]
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(data, tag)
+
 
 class HSF:
     """Hashing String And File"""
@@ -1036,111 +1454,376 @@ class ST:
 
 
 class Image:
+    # sobel算子
+    sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
+    sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+    # 滑块由粗到细搜索的参数
+    coarse_factor = 4  # 粗搜索时边缘图的缩小倍数
+    coarse_candidates = 3  # 粗搜索保留的候选位置数
+    min_confidence = 0.25  # 粗搜索的置信度低于该值时, 退回逐个位置比较
+
     @staticmethod
-    def solve_slide(slide_img: str, canvas_img: str) -> dict:
+    def solve_slide(slide_img: str, canvas_img: str, exhaustive: bool = False) -> dict:
         """
         滑块验证码解析
         :param slide_img, canvas_img: base64编码的图片
+        :param exhaustive: 是否逐个位置比较(为False时先在缩小的边缘图上粗搜索, 置信度低时才逐个位置比较)
         :return dict: {
             "slide": 滑行像素,
             "canvas": 背景总长,
+            "confidence": 置信度(最佳位置与其他位置的差异程度, 越大越可信),
         }
         """
+        slide_img, canvas_img = Image.load_slide(slide_img, canvas_img)
+        slide_xy = Image.find_edge(slide_img)
+        canvas_xy = Image.find_edge(canvas_img)
+        result = None if exhaustive else Image.coarse_to_fine(slide_xy, canvas_xy)
+        if result is None:
+            scores = Image.slide_scores(slide_xy, canvas_xy)
+            slide = int(np.argmin(scores))
+            result = (slide, Image.confidence(scores, slide, slide_xy.shape[1] // 2))
+        return {
+            "slide": result[0],
+            "canvas": canvas_img.shape[1],
+            "confidence": result[1],
+        }
+
+    @staticmethod
+    def coarse_to_fine(slide_xy: np.ndarray, canvas_xy: np.ndarray):
+        """
+        由粗到细搜索滑块位置: 在缩小的边缘图上比较所有位置, 只在最好的几个候选位置附近比较原图
+        :return (int, float)|None: 滑行像素, 置信度; 图片太小或置信度太低时返回None
+        """
+        factor = Image.coarse_factor
+        slide_coarse = Image.downsample(slide_xy, factor)
+        canvas_coarse = Image.downsample(canvas_xy, factor)
+        if 0 in slide_coarse.shape or canvas_coarse.shape[1] <= slide_coarse.shape[1]:
+            return None
+        scores = Image.slide_scores(slide_coarse, canvas_coarse)
+        radius = max(slide_coarse.shape[1] // 2, 1)
+        confidence = Image.confidence(scores, int(np.argmin(scores)), radius)
+        if confidence < Image.min_confidence:
+            return None
+
+        # 候选位置: 依次取最小值, 并排除其附近的位置
+        candidates = []
+        masked = scores.copy()
+        for _ in range(Image.coarse_candidates):
+            best = int(np.argmin(masked))
+            if not np.isfinite(masked[best]):
+                break
+            candidates.append(best)
+            masked[max(best - radius, 0) : best + radius + 1] = np.inf
+        # 在候选位置附近比较原图
+        count = canvas_xy.shape[1] - slide_xy.shape[1]
+        offsets = np.unique(np.concatenate([
+            np.arange(c * factor - factor, c * factor + 2 * factor) for c in candidates
+        ]))
+        offsets = offsets[(offsets >= 0) & (offsets < count)]
+        if not len(offsets):
+            return None
+        fine = Image.slide_scores(slide_xy, canvas_xy, offsets)
+        return int(offsets[np.argmin(fine)]), confidence
+
+    @staticmethod
+    def downsample(img: np.ndarray, factor: int) -> np.ndarray:
+        """按factor×factor的块求平均缩小图片(舍弃不足一块的边缘)"""
+        h, w = img.shape[0] // factor, img.shape[1] // factor
+        return img[: h * factor, : w * factor].reshape(h, factor, w, factor).mean(axis=(1, 3))
+
+    @staticmethod
+    def confidence(scores: np.ndarray, best: int, radius: int) -> float:
+        """
+        最佳位置的置信度: (次佳位置与最佳位置的差距) / (中位数与最佳位置的差距)
+        次佳位置不包括最佳位置附近radius以内的位置
+        """
+        others = np.concatenate((scores[: max(best - radius, 0)], scores[best + radius + 1 :]))
+        spread = np.median(scores) - scores[best]
+        if not len(others) or spread <= 0:
+            return 0.0
+        return float((others.min() - scores[best]) / spread)
+
+    @staticmethod
+    def load_slide(slide_img: str, canvas_img: str):
+        """
+        解码滑块和背景图片, 转为灰度矩阵, 并裁剪到滑块的有内容区域
+        :param slide_img, canvas_img: base64编码的图片
+        :return (np.ndarray, np.ndarray): 滑块, 背景
+        """
         # base64解码
         slide_img = base64.b64decode(slide_img)
         canvas_img = base64.b64decode(canvas_img)
-        # 转为PIL解析图片
-        slide_img = PIL_Image.open(BytesIO(slide_img)).convert("L")
-        canvas_img = PIL_Image.open(BytesIO(canvas_img)).convert("L")
-        # 转为ndarray
-        slide_img: np.ndarray = np.array(slide_img)
-        canvas_img: np.ndarray = np.array(canvas_img)
+        # 转为PIL解析图片, 再转为ndarray
+        slide_img = np.array(PIL_Image.open(BytesIO(slide_img)).convert("L"))
+        canvas_img = np.array(PIL_Image.open(BytesIO(canvas_img)).convert("L"))
 
         # 找到滑块的有内容区域并裁剪
         img_range = np.nonzero(slide_img.sum(axis=1))[0]
         img_range = (np.min(img_range) - 5, np.max(img_range) + 5)
-        slide_img, canvas_img = (
+        return (
             slide_img[img_range[0] : img_range[1], :],
             canvas_img[img_range[0] : img_range[1], :],
         )
 
-        # numpy实现的卷积
-        def convolution_2d(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
-            """
-            二维卷积(边缘补0)
-            """
-            img_h = img.shape[0]
-            img_w = img.shape[1]
-            img_canvas = np.zeros((img_h + 2, img_w + 2))
-            img_canvas[1:-1, 1:-1] = img
-            result_canvas = np.zeros([img_h, img_w])
-            for i in range(img_h):
-                for j in range(img_w):
-                    temp = img_canvas[i : i + 3, j : j + 3]
-                    temp = np.multiply(temp, kernel)
-                    result_canvas[i][j] = temp.sum()
-            return result_canvas
-
-        # 卷积找边缘
-        def find_edge(img: np.ndarray) -> np.ndarray:
-            """
-            利用sobel算子进行卷积, 查找图片边缘。返回值归一到0-255。
-            :param img: np.ndarray
-            """
-            # sobel算子
-            sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
-            sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
-
-            # 计算x方向卷积
-            img_x = convolution_2d(img, sobel_x)
-            # 计算y方向卷积
-            img_y = convolution_2d(img, sobel_y)
-            # 得到梯度矩阵
-            img_xy = np.sqrt(img_x**2 + img_y**2)
-            # 梯度矩阵归一到0-255
-            img_xy = img_xy * (255 / img_xy.max())
-            return img_xy
-
-        slide_xy = find_edge(slide_img)
-        canvas_xy = find_edge(canvas_img)
-
-        XE = []
-        YE = []
-        for x in range(canvas_xy.shape[1] - slide_xy.shape[1]):
-            canvas_slide = np.zeros(canvas_xy.shape)
-            canvas_slide[:, x : x + slide_xy.shape[1]] = slide_xy
-            canvas_overlay = np.abs(canvas_slide - canvas_xy)
-            XE.append(x)
-            YE.append(np.sum(canvas_overlay))
-
-        # matplotlib 绘图
-
-        # YE2 = (YE - np.min(YE)) / (np.max(YE) - np.min(YE)) * 100
-        # output = Path("test")
-        # output.mkdir(exist_ok=True)
-        # plt.imshow(canvas_xy, cmap="gray_r")
-        # plt.plot(XE, YE2)
-        # plt.plot([np.argmin(YE2), np.argmin(YE2)], [0, 100])
-        # # plt.savefig(output / f"{time.time()}.png", bbox_inches="tight")
-        # plt.cla()
-
-        # x = 0
-        # while x < canvas_xy.shape[1] - slide_xy.shape[1]:
-        #     canvas_slide = np.zeros(canvas_xy.shape)
-        #     canvas_slide[:, x : x + slide_xy.shape[1]] = slide_xy
-        #     canvas_overlay = np.abs(canvas_slide - canvas_xy)
-
-        #     plt.imshow(canvas_overlay, cmap="gray_r")  # todo_tmp
-        #     plt.plot(XE[0:x], YE2[0:x])
-        #     plt.plot([x, x], [0, 100])
-        #     plt.savefig(f"test/{x+10000}.png", bbox_inches="tight")
-        #     plt.cla()
-        #     x += max(int(YE2[x] / 100 * 5), 1)
+    @staticmethod
+    def convolution_2d(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+        """
+        二维卷积(边缘补0)
+        将补0后的图片按卷积核的9个位置各平移一次, 加权求和(不逐像素循环)
+        """
+        img_h, img_w = img.shape
+        img_canvas = np.zeros((img_h + 2, img_w + 2))
+        img_canvas[1:-1, 1:-1] = img
+        result_canvas = np.zeros((img_h, img_w))
+        for i in range(3):
+            for j in range(3):
+                if kernel[i, j]:
+                    result_canvas += kernel[i, j] * img_canvas[i : i + img_h, j : j + img_w]
+        return result_canvas
 
-        return {
-            "slide": np.argmin(YE),
-            "canvas": canvas_img.shape[1],
-        }
+    @staticmethod
+    def find_edge(img: np.ndarray) -> np.ndarray:
+        """
+        利用sobel算子进行卷积, 查找图片边缘。返回值归一到0-255。
+        :param img: np.ndarray
+        """
+        # 计算x方向卷积
+        img_x = Image.convolution_2d(img, Image.sobel_x)
+        # 计算y方向卷积
+        img_y = Image.convolution_2d(img, Image.sobel_y)
+        # 得到梯度矩阵
+        img_xy = np.sqrt(img_x**2 + img_y**2)
+        # 梯度矩阵归一到0-255
+        img_xy = img_xy * (255 / img_xy.max())
+        return img_xy
+
+    @staticmethod
+    def slide_scores(slide_xy: np.ndarray, canvas_xy: np.ndarray, offsets: np.ndarray = None) -> np.ndarray:
+        """
+        计算滑块放在背景每个横向位置时, 两者边缘的差异(越小越吻合)
+        等价于把滑块放在与背景同样大小的空白画布上, 求与背景之差的绝对值之和:
+        窗口外的部分就是背景本身(用列和的前缀和求出), 窗口内的部分用滑动窗口视图一次求出
+        :param offsets: 只计算这些位置(为None时计算所有位置)
+        :return np.ndarray: 第x项为滑块左边缘在x(或offsets[x])处时的差异(x为0到背景宽度-滑块宽度-1)
+        """
+        slide_h, slide_w = slide_xy.shape
+        count = canvas_xy.shape[1] - slide_w
+        if count <= 0:
+            return np.zeros(0)
+        # 窗口外: 背景总和 - 窗口内的背景之和
+        column_sum = np.concatenate(([0.0], np.cumsum(canvas_xy.sum(axis=0))))
+        if offsets is None:
+            offsets = np.arange(count)
+        outside = column_sum[-1] - (column_sum[offsets + slide_w] - column_sum[offsets])
+        # 窗口内: 滑块与背景的差异(windows[x]是背景中从x列开始、与滑块同样大小的区域)
+        canvas_xy = np.ascontiguousarray(canvas_xy)
+        row_stride, column_stride = canvas_xy.strides
+        windows = np.lib.stride_tricks.as_strided(
+            canvas_xy,
+            shape=(count, slide_h, slide_w),
+            strides=(column_stride, row_stride, column_stride),
+            writeable=False,
+        )
+        if len(offsets) != count:
+            windows = windows[offsets]
+        inside = np.abs(windows - slide_xy).sum(axis=(1, 2))
+        return outside + inside
+
+
+class CaptchaPool:
+    """
+    验证码识别进程池
+    :feature: CPU密集的验证码识别在独立的进程中执行, 不占用执行任务的线程的GIL, 其他用户的网络请求不受影响
+    :feature: submit返回Future; 已提交未完成的识别数量有上限, 达到上限时submit等待空位
+    :feature: 记录每次识别的排队耗时和执行耗时, 识别进程中的日志会合并回主进程
+    :feature: 无法创建识别进程时(比如部分云函数环境), 本次运行改为在调用的线程中直接识别
+    """
+
+    workers: int = 0  # 识别进程数(为0时在调用的线程中直接识别)
+    queueSize: int = 4  # 已提交未完成的识别数量上限
+    timeout: float = 120  # 等待空位/识别结果的超时时间(秒)
+    stats = {"count": 0, "errors": 0, "waitTime": 0.0, "solveTime": 0.0, "maxSolveTime": 0.0}
+    _executor: ProcessPoolExecutor = None
+    _pending = set()  # 已提交到进程池、尚未完成的Future
+    _slots = threading.BoundedSemaphore(4)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(workers: int = 0, queueSize: int = 4):
+        """
+        :params workers: 识别进程数(为0时在调用的线程中直接识别)
+        :params queueSize: 已提交未完成的识别数量上限
+        """
+        CaptchaPool.shutdown()
+        with CaptchaPool._lock:
+            CaptchaPool.workers = max(int(workers), 0)
+            CaptchaPool.queueSize = max(int(queueSize), 1)
+            CaptchaPool._slots = threading.BoundedSemaphore(CaptchaPool.queueSize)
+        CaptchaPool.resetStats()
+
+    @staticmethod
+    def resetStats():
+        CaptchaPool.stats = {"count": 0, "errors": 0, "waitTime": 0.0, "solveTime": 0.0, "maxSolveTime": 0.0}
+
+    @staticmethod
+    def shutdown():
+        """关闭识别进程(下次提交时重新创建)"""
+        with CaptchaPool._lock:
+            executor, CaptchaPool._executor = CaptchaPool._executor, None
+            pending, CaptchaPool._pending = CaptchaPool._pending, set()
+        if executor:
+            # 取消排队中的识别(shutdown的cancel_futures参数需要Python3.9)
+            for inner in pending:
+                inner.cancel()
+            # Python3.8及以下shutdown(wait=False)会提前关闭进程池内部的管道, 正在执行的识别无法返回结果, 所以等待其结束
+            executor.shutdown(wait=sys.version_info < (3, 9))
+
+    @staticmethod
+    def submit(func, *args) -> Future:
+        """
+        提交识别
+        :params func: 识别函数(需要可以被pickle, 比如模块级函数或静态方法)
+        :returns Future: 识别结果(识别函数抛出的异常也会由Future抛出)
+        """
+        slots = CaptchaPool._slots
+        if not slots.acquire(timeout=CaptchaPool.timeout):
+            raise TimeoutError(f"验证码识别排队超时({CaptchaPool.timeout}秒)")
+        future = Future()
+        submitTime = time.time()
+        executor = inner = None
+        if CaptchaPool.workers:
+            try:
+                executor = CaptchaPool._getExecutor()
+                inner = executor.submit(_captchaWorker, func, args)
+            except (OSError, ImportError, NotImplementedError, BrokenProcessPool) as e:
+                CaptchaPool._fallback(e)
+            except BaseException:
+                slots.release()
+                raise
+        if inner is None:
+            # 不使用进程池时直接识别
+            try:
+                outcome = _captchaWorker(func, args)
+            finally:
+                slots.release()
+            CaptchaPool._finish(future, outcome, submitTime)
+            return future
+        with CaptchaPool._lock:
+            CaptchaPool._pending.add(inner)
+
+        def done(inner: Future):
+            with CaptchaPool._lock:
+                CaptchaPool._pending.discard(inner)
+            slots.release()
+            try:
+                outcome = inner.result()
+            except BaseException as e:
+                with CaptchaPool._lock:
+                    if isinstance(e, BrokenProcessPool) and CaptchaPool._executor is executor:
+                        # 进程池已经不可用, 下次提交时重新创建(回调在进程池的线程中执行, 不能在这里shutdown)
+                        CaptchaPool._executor = None
+                    CaptchaPool.stats["errors"] += 1
+                future.set_exception(e)
+                return
+            CaptchaPool._finish(future, outcome, submitTime)
+
+        inner.add_done_callback(done)
+        return future
+
+    @staticmethod
+    def solve(func, *args):
+        """提交识别并等待结果(识别进程意外退出时改为直接识别)"""
+        try:
+            return CaptchaPool.submit(func, *args).result(timeout=CaptchaPool.timeout)
+        except BrokenProcessPool as e:
+            CaptchaPool._fallback(e)
+            return CaptchaPool.submit(func, *args).result(timeout=CaptchaPool.timeout)
+
+    @staticmethod
+    def solveSlide(slide_img: str, canvas_img: str) -> dict:
+        """滑块验证码识别(见Image.solve_slide)"""
+        return CaptchaPool.solve(Image.solve_slide, slide_img, canvas_img)
+
+    @staticmethod
+    def formatStats():
+        """:returns str: 识别次数和平均耗时(没有识别时返回"")"""
+        stats = CaptchaPool.stats
+        if not stats["count"]:
+            return ""
+        return "验证码识别%d次(出错%d次), 平均排队%.3f秒, 平均识别%.3f秒, 最长识别%.3f秒" % (
+            stats["count"], stats["errors"], stats["waitTime"] / stats["count"],
+            stats["solveTime"] / stats["count"], stats["maxSolveTime"])
+
+    @staticmethod
+    def _fallback(error: BaseException):
+        """识别进程不可用: 本次运行之后的识别都在调用的线程中直接识别"""
+        with CaptchaPool._lock:
+            if not CaptchaPool.workers:
+                return
+            CaptchaPool.workers = 0
+        LL.log(2, f"验证码识别进程不可用, 改为在执行任务的线程中识别[{error}]")
+        CaptchaPool.shutdown()
+
+    @staticmethod
+    def _getExecutor():
+        with CaptchaPool._lock:
+            if CaptchaPool._executor is None:
+                CaptchaPool._executor = ProcessPoolExecutor(
+                    max_workers=CaptchaPool.workers, initializer=_captchaWorkerInit)
+            return CaptchaPool._executor
+
+    @staticmethod
+    def _finish(future: Future, outcome: tuple, submitTime: float):
+        """记录耗时, 合并识别进程的日志, 设置识别结果"""
+        result, error, startTime, solveTime, logs = outcome
+        with CaptchaPool._lock:
+            stats = CaptchaPool.stats
+            stats["count"] += 1
+            stats["waitTime"] += max(startTime - submitTime, 0)
+            stats["solveTime"] += solveTime
+            stats["maxSolveTime"] = max(stats["maxSolveTime"], solveTime)
+            if error is not None:
+                stats["errors"] += 1
+        if logs:
+            with LL._lock:
+                for logItem in logs:
+                    LL.log_list.append(logItem)
+                    if logItem[1] >= LL.printLevel:
+                        print(LL.log2FormatStr(logItem))
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+_inCaptchaWorker = False  # 当前进程是否为验证码识别进程
+
+
+def _captchaWorkerInit():
+    """识别进程初始化: 重建可能在fork时被其他线程持有的日志锁, 日志不在识别进程中输出(由主进程合并输出)"""
+    global _inCaptchaWorker
+    _inCaptchaWorker = True
+    LL._lock = threading.RLock()
+    LL.printLevel = len(LL.logTypeDisplay)
+
+
+def _captchaWorker(func, args):
+    """
+    执行识别函数
+    :returns tuple: (结果, 异常, 开始时间, 识别耗时, 识别进程中的日志)
+    """
+    if _inCaptchaWorker:
+        LL.log_list = []
+    startTime = time.time()
+    result = error = None
+    try:
+        result = func(*args)
+    except Exception as e:
+        error = e
+    solveTime = time.time() - startTime
+    # 在调用的线程中直接识别时, 日志已经记录在主进程中
+    logs = LL.log_list if _inCaptchaWorker else []
+    return result, error, startTime, solveTime, logs
 
 
 class SuperString:
@@ -1254,7 +1937,7 @@ class ProxyGet:
             for times in range(1, self.maxRetry + 1):
                 try:
                     res = None
-                    res = requests.get(self.api, params=self.params).json()
+                    res = reqSession.shared().get(self.api, params=self.params).json()
                     proxyLoc = res["obj"][0]
                     proxyUrl = f"http://{proxyLoc['ip']}:{proxyLoc['port']}"
                     proxy = {"http": proxyUrl, "https": proxyUrl}
@@ -1308,13 +1991,18 @@ class UserDefined:
                 "exceptError": ...,  # 捕获的异常
             }
         """
+        # 日志中省略各任务的webhook列表(任务较多时序列化整个列表开销很大)
+        logContext = context
+        if isinstance(context.get("taskWebhook"), list):
+            logContext = dict(
+                context, taskWebhook=f"(共{len(context['taskWebhook'])}个任务, 已省略)")
         LL.log(
             1,
             f"收到事件「{event.get('msg')}({event.get('code')})」, 尝试触发用户自定义函数",
             "event",
             event,
             "context",
-            context,
+            logContext,
         )
         # ==========返回值模板==========
         result = {
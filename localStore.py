@@ -0,0 +1,520 @@
+import json
+import os
+import re
+import threading
+import time
+
+from login.Utils import Utils
+from liteTools import LL, DT, CT, TaskError
+
+
+class JsonStore:
+    """
+    本地json文件(各项本地缓存/记录共用)
+    :feature: 第一次使用时才读取文件, 可以在写入前重新读取(多进程执行时其他进程可能已经写入)
+    :feature: 写入失败时(比如云函数的只读文件系统)只记录一次日志, 本次运行不再写入
+    :feature: 不加锁, 由使用者加锁
+    """
+
+    def __init__(self, path: str, name: str, private: bool = False):
+        """
+        :params path: 文件路径(为None时只在内存中保存)
+        :params name: 日志中显示的名称
+        :params private: 是否只允许当前用户读写(文件中包含登录凭证等)
+        """
+        self.path = path
+        self.name = name
+        self.private = private
+        self._data: dict = None
+        self._disabled = False  # 写入失败后不再尝试写入
+
+    @property
+    def data(self) -> dict:
+        """文件内容(文件不存在或者无法解析时为{})"""
+        if self._data is None:
+            self._data = self._read() or {}
+        return self._data
+
+    def reload(self):
+        """
+        重新读取文件(读取失败时保留内存中的内容)
+        :returns dict: 文件内容
+        """
+        data = self._read()
+        if data is not None:
+            self._data = data
+        return self.data
+
+    def write(self):
+        """
+        写入文件(失败时仅记录日志, 不影响任务执行)
+        :returns bool: 是否已写入
+        """
+        if self._disabled or not self.path:
+            return False
+        try:
+            DT.writeJson(self.data, self.path)
+            if self.private and os.name == "posix":
+                os.chmod(self.path, 0o600)
+            return True
+        except OSError as e:
+            LL.log(2, f"{self.name}写入失败, 本次运行不再写入[{e}]")
+            self._disabled = True
+            return False
+
+    def _read(self):
+        data = DT.loadJson(self.path, None) if self.path else None
+        return data if isinstance(data, dict) else None
+
+
+class SessionCache:
+    """
+    登录状态本地缓存
+    以SignTask.uuid为键, 将登录后的cookies和host保存到本地, 下次运行时可以跳过登录
+    """
+
+    def __init__(self, cacheDir: str, ttl: float = 21600, password: str = ""):
+        """
+        :params cacheDir: 缓存目录
+        :params ttl: 缓存有效期(秒)
+        :params password: 加密口令, 为空时不加密
+        """
+        self.ttl = float(ttl)
+        self.password = str(password or "")
+        self._lock = threading.Lock()
+        self._store = JsonStore(os.path.join(cacheDir, "sessions.json"), "登录状态缓存", private=True)
+
+    def load(self, uuid: str):
+        """
+        读取缓存的登录状态
+        :returns dict|None: {"host": ..., "headers": ..., "cookies": [...]}, 缓存不存在/过期/无法解密时返回None
+        """
+        with self._lock:
+            entry = self._store.data.get(uuid)
+        if not entry:
+            return None
+        if time.time() - entry.get("time", 0) > self.ttl:
+            LL.log(1, "本地缓存的登录状态已过期")
+            self.drop(uuid)
+            return None
+        try:
+            data = entry["data"]
+            if entry.get("encrypted"):
+                data = CT.aesDecrypt(data, self.password).decode("utf-8")
+            return json.loads(data)
+        except Exception as e:
+            LL.log(2, f"本地缓存的登录状态读取失败[{e}]")
+            self.drop(uuid)
+            return None
+
+    def save(self, uuid: str, sessionData: dict):
+        """
+        保存登录状态
+        :params sessionData: TodayLoginService.dumpSession()的返回值
+        """
+        data = json.dumps(sessionData, ensure_ascii=False)
+        entry = {"time": time.time(), "encrypted": bool(self.password)}
+        if self.password:
+            entry["data"] = CT.aesEncrypt(data.encode("utf-8"), self.password)
+        else:
+            entry["data"] = data
+        with self._lock:
+            # 重新读取(多进程执行时, 其他进程可能已经写入了别的用户的登录状态)
+            self._store.reload()[uuid] = entry
+            self._write()
+
+    def drop(self, uuid: str):
+        """删除登录状态"""
+        with self._lock:
+            if self._store.reload().pop(uuid, None) is not None:
+                self._write()
+
+    def _write(self):
+        """丢弃过期的登录状态后写入缓存文件(调用时需持有_lock)"""
+        entries = self._store.data
+        now = time.time()
+        for k in [k for k, v in entries.items() if now - v.get("time", 0) > self.ttl]:
+            del entries[k]
+        self._store.write()
+
+
+class RunCheckpoint:
+    """
+    任务状态检查点(追加写入的json lines文件)
+    运行中途意外退出(比如云函数超时)时, 下次运行可以跳过已经完成的任务
+    第一行为{"run": 开始时间, "date": 任务日期}, 之后每行为一个任务的状态{"key", "code", "attempts", "msg"}, 正常结束时追加{"end": 结束时间}
+    """
+
+    def __init__(self, cacheDir: str, ttl: float = 21600):
+        """
+        :params cacheDir: 缓存目录
+        :params ttl: 检查点有效期(秒), 超过有效期的未结束运行不再恢复
+        """
+        self.path = os.path.join(cacheDir, "checkpoint.jsonl")
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._disabled = False  # 写入失败后不再尝试写入
+
+    def load(self, date: str):
+        """
+        读取上次运行的检查点
+        :params date: 本次运行的任务日期("%Y-%m-%d"), 上次运行的任务日期不同时不恢复(比如昨天中断的运行)
+        :returns (startTime, states)|None: 上次运行的开始时间和各任务最后的状态({key: {"code", "attempts", "msg"}}); 上次运行已正常结束、已过期或者没有检查点时返回None
+        """
+        startTime = None
+        runDate = None
+        states = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        # 写入中断的行
+                        continue
+                    if "run" in item:
+                        startTime = item["run"]
+                        runDate = item.get("date")
+                        states.clear()
+                    elif "end" in item:
+                        startTime = None
+                    elif "key" in item:
+                        states[item["key"]] = item
+        except OSError:
+            return None
+        if startTime is None:
+            return None
+        if runDate != date:
+            LL.log(1, f"上次中断的运行不是同一天({runDate})的任务, 不恢复")
+            return None
+        if time.time() - startTime > self.ttl:
+            LL.log(1, "上次中断的运行已超过检查点有效期, 不恢复")
+            return None
+        return startTime, states
+
+    def start(self, startTime: float, date: str):
+        """
+        开始新的运行(清空之前的检查点)
+        :params date: 本次运行的任务日期("%Y-%m-%d")
+        """
+        self._append({"run": startTime, "date": date}, "w")
+
+    def record(self, key: str, code: int, attempts: int, msg: str):
+        """记录任务状态"""
+        self._append({"key": key, "code": code,
+                     "attempts": attempts, "msg": msg})
+
+    def finish(self):
+        """标记运行正常结束"""
+        self._append({"end": time.time()})
+
+    def _append(self, item: dict, mode: str = "a"):
+        """写入一行(失败时仅记录日志, 不影响任务执行)"""
+        if self._disabled:
+            return
+        line = json.dumps(item, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, mode, encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                LL.log(2, f"任务检查点写入失败, 本次运行不再记录检查点[{e}]")
+                self._disabled = True
+
+
+class CompletionLedger:
+    """
+    每日完成记录
+    以SignTask.taskKey为键, 记录任务最近一次完成(状态码100/101)的日期, 当天再次运行时可以跳过登录和查询
+    """
+
+    def __init__(self, cacheDir: str):
+        """
+        :params cacheDir: 缓存目录
+        """
+        self._lock = threading.Lock()
+        self._store = JsonStore(os.path.join(cacheDir, "ledger.json"), "完成记录")
+
+    def isDone(self, key: str, date: str):
+        """任务在该日期是否已经完成"""
+        with self._lock:
+            return self._store.data.get(key) == date
+
+    def record(self, key: str, date: str):
+        """记录任务在该日期已经完成"""
+        with self._lock:
+            # 重新读取(多进程执行时其他进程可能已经写入), 并丢弃之前日期的记录
+            entries = self._store.reload()
+            for k in [k for k, v in entries.items() if v != date]:
+                del entries[k]
+            entries[key] = date
+            self._store.write()
+
+
+class DeadlineStore:
+    """
+    任务时间窗口记录
+    从任务列表/详情的返回结果中学习各任务的开始和截止时间(以SignTask.taskKey为键), 供调度时按截止时间先后排序
+    学到的时间窗口先保存在内存中, 运行结束时(flush)统一写入
+    """
+
+    # 返回结果中代表时间窗口的字段(开始时间, 截止时间): 周期任务为"HH:MM", 单次任务为"YYYY-MM-DD HH:MM"
+    windowFields = (
+        ("rateTaskBeginTime", "rateTaskEndTime"),
+        ("singleTaskBeginTime", "singleTaskEndTime"),
+        ("startTime", "endTime"),
+    )
+    timePattern = re.compile(r"^\s*(?:(\d{4}-\d{1,2}-\d{1,2})\s+)?(\d{1,2}):(\d{2})")
+
+    def __init__(self, cacheDir: str):
+        """
+        :params cacheDir: 缓存目录
+        """
+        self._lock = threading.Lock()
+        self._store = JsonStore(os.path.join(cacheDir, "deadlines.json"), "任务时间窗口记录")
+        self._learned = {}  # 本次运行中学到的(有变化的)时间窗口, 运行结束时统一写入
+
+    def learn(self, key: str, item: dict):
+        """
+        从任务列表/详情中的一项学习任务的时间窗口
+        :params item: 任务信息(接口返回的字典)
+        """
+        if not isinstance(item, dict):
+            return
+        for beginField, endField in DeadlineStore.windowFields:
+            end = item.get(endField)
+            if isinstance(end, str) and DeadlineStore.timePattern.match(end):
+                begin = item.get(beginField)
+                window = {"begin": begin if isinstance(begin, str) else "", "end": end}
+                break
+        else:
+            return
+        with self._lock:
+            if self._store.data.get(key) != window:
+                self._store.data[key] = window
+                self._learned[key] = window
+
+    def flush(self):
+        """将本次运行中学到的时间窗口写入文件(运行结束时调用)"""
+        with self._lock:
+            if not self._learned:
+                return
+            # 重新读取(多进程执行时其他进程可能已经写入)后合并
+            self._store.reload().update(self._learned)
+            if self._store.write():
+                self._learned.clear()
+
+    def deadline(self, key: str, date: str):
+        """
+        任务在该日期的截止时间
+        :params date: 日期("%Y-%m-%d")
+        :returns float|None: 截止时间的时间戳, 没有记录或者单次任务不在该日期时返回None
+        """
+        with self._lock:
+            window = self._store.data.get(key)
+        if not window:
+            return None
+        return DeadlineStore.parseTime(window["end"], date)
+
+    @staticmethod
+    def parseTime(timeStr: str, date: str):
+        """
+        将时间窗口中的时间转换为时间戳
+        :params date: 周期任务("HH:MM")所在的日期
+        :returns float|None: 单次任务不在该日期时返回None
+        """
+        match = DeadlineStore.timePattern.match(timeStr)
+        if not match:
+            return None
+        day, hour, minute = match.groups()
+        try:
+            if day:
+                day = time.strftime("%Y-%m-%d", time.strptime(day, "%Y-%m-%d"))
+                if day != date:
+                    return None
+            return time.mktime(time.strptime(f"{date} {hour}:{minute}", "%Y-%m-%d %H:%M"))
+        except ValueError:
+            return None
+
+
+class TenantDirectory:
+    """
+    学校(租户)目录缓存
+    :feature: 学校列表缓存到本地, 过期后带上ETag/Last-Modified条件刷新, 并按学校名称建立索引
+    :feature: 缓存各学校的接入方式和解析后的登录地址(login_url/host/login_host)
+    :feature: 同一学校同时只有一个线程在解析, 并发执行的同校用户共享解析结果
+    """
+
+    listUrl = "https://mobile.campushoy.com/v6/config/guest/tenant/list"
+    infoUrl = "https://mobile.campushoy.com/v6/config/guest/tenant/info"
+    ttl: float = 86400  # 缓存有效期(秒)
+    # 缓存文件内容: {"list": {"time", "etag", "lastModified", "items"}, "schools": {学校名称: {"time", ...}}}
+    _store = JsonStore(None, "学校目录缓存")
+    _index: dict = None  # 学校名称到学校列表项的索引(为None时尚未载入缓存)
+    _lock = threading.Lock()  # 保护_store和_index
+    _refreshLock = threading.Lock()  # 同时只有一个线程下载学校列表(下载时不持有_lock, 不阻塞其他学校读取缓存)
+    _schoolLocks = {}  # 每个学校一把解析锁
+
+    @staticmethod
+    def configure(cacheDir: str = None, ttl: float = 86400):
+        """
+        :params cacheDir: 缓存目录(为空时只在内存中缓存)
+        :params ttl: 缓存有效期(秒)
+        """
+        with TenantDirectory._lock:
+            path = os.path.join(cacheDir, "tenants.json") if cacheDir else None
+            TenantDirectory._store = JsonStore(path, "学校目录缓存")
+            TenantDirectory.ttl = float(ttl)
+            TenantDirectory._index = None
+
+    @staticmethod
+    def resolve(schoolName: str, session):
+        """
+        获取学校的登录地址
+        :params session: 用于请求的Session(用户的代理、UA)
+        :returns dict: {"host": ..., "login_url": ..., "login_host": ...}
+        """
+        with TenantDirectory._lock:
+            lock = TenantDirectory._schoolLocks.setdefault(schoolName, threading.Lock())
+        with lock:
+            school = TenantDirectory._getSchool(schoolName)
+            if school and time.time() - school["time"] < TenantDirectory.ttl:
+                LL.log(1, f"使用缓存的「{schoolName}」登录地址")
+            else:
+                item = TenantDirectory._findSchool(schoolName, session)
+                school = TenantDirectory._resolveSchool(item, session)
+                with TenantDirectory._lock:
+                    TenantDirectory._store.data["schools"][schoolName] = school
+                    TenantDirectory._store.write()
+        if school["joinType"] == "NONE":
+            raise TaskError(schoolName + "未加入今日校园，请检查...", 301)
+        LL.log(1, f"「{schoolName}」接入今日校园方式为「{school['joinType']}」")
+        return school
+
+    @staticmethod
+    def drop(schoolName: str):
+        """删除学校的缓存(比如使用缓存的登录地址登录失败时)"""
+        with TenantDirectory._lock:
+            TenantDirectory._load()
+            if TenantDirectory._store.data["schools"].pop(schoolName, None) is not None:
+                TenantDirectory._store.write()
+
+    @staticmethod
+    def _getSchool(schoolName: str):
+        with TenantDirectory._lock:
+            TenantDirectory._load()
+            return TenantDirectory._store.data["schools"].get(schoolName)
+
+    @staticmethod
+    def _findSchool(schoolName: str, session):
+        """
+        在学校列表中查找学校(列表过期, 或者学校不在列表中时先刷新一次)
+        :returns dict: 学校列表项
+        """
+        with TenantDirectory._lock:
+            TenantDirectory._load()
+            listTime = TenantDirectory._store.data["list"].get("time", 0)
+            item = TenantDirectory._index.get(schoolName)
+        # 学校不在列表中时, 可能是缓存列表之后新加入/改名的学校, 也需要刷新
+        if not item or time.time() - listTime >= TenantDirectory.ttl:
+            with TenantDirectory._refreshLock:
+                with TenantDirectory._lock:
+                    refreshed = TenantDirectory._store.data["list"].get("time", 0) != listTime
+                # 等待期间其他线程已经刷新过时不再重复刷新
+                if not refreshed:
+                    TenantDirectory._refreshList(session)
+            with TenantDirectory._lock:
+                item = TenantDirectory._index.get(schoolName)
+        if not item:
+            raise TaskError(f"没有找到名为「{schoolName}」的学校，请检查学校名称", 301)
+        return item
+
+    @staticmethod
+    def _refreshList(session):
+        """刷新学校列表(调用时需持有_refreshLock, 不能持有_lock)"""
+        with TenantDirectory._lock:
+            cached = dict(TenantDirectory._store.data["list"])
+        headers = {}
+        if cached.get("items"):
+            # 条件请求: 列表没有变化时服务器只需返回304
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("lastModified"):
+                headers["If-Modified-Since"] = cached["lastModified"]
+        res = session.get(
+            TenantDirectory.listUrl,
+            headers=headers,
+            verify=False,
+            hooks=dict(response=[Utils.checkStatus]),
+        )
+        with TenantDirectory._lock:
+            if res.status_code == 304:
+                LL.log(1, "学校列表没有变化")
+                TenantDirectory._store.data["list"]["time"] = time.time()
+            else:
+                TenantDirectory._store.data["list"] = {
+                    "time": time.time(),
+                    "etag": res.headers.get("ETag"),
+                    "lastModified": res.headers.get("Last-Modified"),
+                    "items": res.json()["data"],
+                }
+                TenantDirectory._buildIndex()
+                LL.log(1, "已更新学校列表")
+            TenantDirectory._store.write()
+
+    @staticmethod
+    def _resolveSchool(item: dict, session):
+        """
+        获取学校信息并解析登录地址
+        :params item: 学校列表项
+        :returns dict: {"time", "joinType", "host", "login_url", "login_host"}
+        """
+        school = {"time": time.time(), "joinType": item["joinType"],
+                  "host": "", "login_url": "", "login_host": ""}
+        if item["joinType"] == "NONE":
+            return school
+        data = session.get(
+            TenantDirectory.infoUrl,
+            params={"ids": item["id"]},
+            verify=False,
+            hooks=dict(response=[Utils.checkStatus]),
+        ).json()["data"][0]
+        ampUrl = data["ampUrl"]
+        if "campusphere" in ampUrl or "cpdaily" in ampUrl:
+            school["host"] = re.findall(r"\w{4,5}\:\/\/.*?\/", ampUrl)[0]
+            status_code = 0
+            while status_code != 200:
+                newAmpUrl = session.get(ampUrl, allow_redirects=False, verify=False)
+                status_code = newAmpUrl.status_code
+                if "Location" in newAmpUrl.headers:
+                    ampUrl = newAmpUrl.headers["Location"]
+            school["login_url"] = ampUrl
+            school["login_host"] = re.findall(r"\w{4,5}\:\/\/.*?\/", ampUrl)[0]
+        ampUrl2 = data["ampUrl2"]
+        if "campusphere" in ampUrl2 or "cpdaily" in ampUrl2:
+            school["host"] = re.findall(r"\w{4,5}\:\/\/.*?\/", ampUrl2)[0]
+            ampUrl2 = session.get(ampUrl2, verify=False).url
+            school["login_url"] = ampUrl2
+            school["login_host"] = re.findall(r"\w{4,5}\:\/\/.*?\/", ampUrl2)[0]
+        return school
+
+    @staticmethod
+    def _load():
+        """载入缓存(调用时需持有_lock)"""
+        if TenantDirectory._index is not None:
+            return
+        data = TenantDirectory._store.data
+        data.setdefault("list", {})
+        data.setdefault("schools", {})
+        TenantDirectory._buildIndex()
+
+    @staticmethod
+    def _buildIndex():
+        """按学校名称建立索引(重名时取第一个, 与之前逐个查找的结果一致)"""
+        index = {}
+        for item in TenantDirectory._store.data["list"].get("items") or []:
+            index.setdefault(item["name"], item)
+        TenantDirectory._index = index
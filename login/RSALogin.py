@@ -3,6 +3,8 @@ import requests
 from bs4 import BeautifulSoup
 from urllib3.exceptions import InsecureRequestWarning
 from login.Utils import Utils
+from login.formParser import FormParser
+from liteTools import LoginUrlError
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -19,28 +21,20 @@ class RSALogin:
     # 登陆方法
     def login(self):
         html = self.session.get(self.login_url, verify=False).text
-        soup = BeautifulSoup(html, 'lxml')
-        form = soup.select('#fm1')
-        if len(form) == 0:
-            raise Exception('出错啦！网页中没有找到LoginForm')
-        soup = BeautifulSoup(str(form[0]), 'lxml')
+        # 一次遍历解析id为fm1的表单
+        form = FormParser.parse(html, formId='fm1', skipButtons=False)
+        if not form['found']:
+            raise LoginUrlError('出错啦！网页中没有找到LoginForm')
         # 填充数据
-        params = {}
-        form = soup.select('input')
-        for item in form:
-            if None != item.get('name') and len(item.get('name')) > 0:
-                if item.get('name') != 'rememberMe':
-                    if None == item.get('value'):
-                        params[item.get('name')] = ''
-                    else:
-                        params[item.get('name')] = item.get('value')
+        params = form['params']
+        params.pop('rememberMe', None)
         params['username'] = self.username
         pattern = 'RSAKeyPair\((.*?)\);'
         publicKey = re.findall(pattern, html)
         publicKey = publicKey[0].replace('"', "").split(',')
         params['password'] = Utils.encryptRSA(self.password, publicKey[2],
                                               publicKey[0])
-        if len(soup.select('input#capycha'))!= 0:
+        if 'capycha' in form['inputIds']:
             imgUrl = self.host + 'lyuapServer/captcha.jsp'
             params['captcha'] = Utils.getCodeFromImg(self.session, imgUrl)
         else:
@@ -51,7 +45,7 @@ class RSALogin:
             jump_url = data.headers['Location']
             res = self.session.post(jump_url, verify=False)
             if res.url.find('campusphere.net/') == -1:
-                raise Exception('登录失败,未能成功跳转今日校园!')
+                raise LoginUrlError('登录失败,未能成功跳转今日校园!')
             return self.session.cookies
         elif data.status_code == 200:
             data = data.text
@@ -59,4 +53,4 @@ class RSALogin:
             msg = soup.select('#msg')[0].get_text()
             raise Exception(msg)
         else:
-            raise Exception('登陆失败！请反馈！返回状态码：' + str(data.status_code))
+            raise LoginUrlError('登陆失败！请反馈！返回状态码：' + str(data.status_code))
@@ -4,6 +4,7 @@ import random
 from datetime import datetime, timezone, timedelta
 from io import BytesIO
 
+import requests
 import rsa
 import yaml
 from Crypto.Cipher import AES
@@ -26,8 +27,10 @@ class Utils:
     @staticmethod
     def checkStatus(request, *args, **kwargs):
         if request.status_code == 418:
-            raise Exception(
-                "[HTTP 418]\n当前IP地址已被屏蔽\n请尝试使用其他地区的云函数节点/服务器\n或者在配置中填入可用代理(方式见文档)"
+            # 异常携带响应, 以便熔断器(liteTools.CircuitBreaker)统计
+            raise requests.HTTPError(
+                "[HTTP 418]\n当前IP地址已被屏蔽\n请尝试使用其他地区的云函数节点/服务器\n或者在配置中填入可用代理(方式见文档)",
+                response=request,
             )
 
     # 获取当前北京时间
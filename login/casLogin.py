@@ -3,7 +3,8 @@ import requests
 from bs4 import BeautifulSoup
 from urllib3.exceptions import InsecureRequestWarning
 from login.Utils import Utils
-from liteTools import Image
+from login.formParser import FormParser
+from liteTools import CaptchaPool, LoginUrlError
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -17,6 +18,7 @@ class casLogin:
         self.host = host
         self.session: requests.Session = session
         self.formType = ""
+        self.captcha_type = "code"
 
     # 判断是否需要验证码
     def getNeedCaptchaUrl(self):
@@ -46,7 +48,8 @@ class casLogin:
             get_captcha_url = self.host + "authserver/common/openSliderCaptcha.htl"
             verify_captcha_url = self.host + "authserver/common/verifySliderCaptcha.htl"
             captcha_data = self.session.get(get_captcha_url).json()
-            solution = Image.solve_slide(
+            # 可以交给验证码识别进程识别(见CaptchaPool), 不阻塞其他用户的请求
+            solution = CaptchaPool.solveSlide(
                 captcha_data["smallImage"], captcha_data["bigImage"]
             )
             verify_data = {
@@ -66,56 +69,16 @@ class casLogin:
 
     def login(self):
         html = self.session.get(self.login_url, verify=False).text
-        if re.findall('<form[^<]*id="casLoginForm"[^>]*>', html, re.I):
-            self.formType = "casLoginForm"
-        elif re.findall('<form[^<]*id="loginFromId"[^>]*>', html, re.I):
-            self.formType = "loginFromId"
-        elif re.findall('<form[^<]*id="fm1"[^>]*>', html, re.I):
-            self.formType = "fm1"
-        # 在html中寻找所有form元素(备注: form几乎不会嵌套form)
-        formElementList = re.findall(r"<form[\s\S]*?</form>", html)
-        # 初始化需要的参数
-        params = {}
-        salt = ""
-        # 寻找包含"password"的form元素
-        for form in formElementList:
-            if re.findall("password", form, re.I):
-                # 在input元素中，查找salt和一些需要提交参数
-
-                inputElementList = re.findall(r"<input[\s\S]*?>", form)
-                for inputElement in inputElementList:
-                    # 查找salt
-                    if re.findall(r"EncryptSalt", inputElement, re.I):
-                        salt = re.findall(r'value="(.*?)"', inputElement)[0]
-                    # 排除type为非文本类型input元素
-                    if re.findall(
-                        r'type="(?:button|checkbox|file|image|radio|reset|submit)"',
-                        inputElement,
-                    ):
-                        continue
-                    # 查找需要提交的数据的键
-                    if re.findall(r"name=", inputElement):
-                        key = re.findall(r'name="(.*?)"', inputElement)[0]
-                    else:
-                        continue
-                    # 查找需要提交的数据的值
-                    if re.findall(r"value=", inputElement):
-                        value = re.findall(r'value="(.*?)"', inputElement)[0]
-                    else:
-                        value = ""
-                    # 填入即将提交的参数字典中
-                    params[key] = value
-        if not salt:
-            """salt可能藏在script中"""
-            maySalt = re.findall(r'var pwdDefaultEncryptSalt ?= ?"(.*?)"', html)
-            if maySalt:
-                salt = maySalt[0]
+        # 一次遍历解析包含"password"的表单: 表单类型、需要提交的参数、salt、验证码类型
+        form = FormParser.parse(html)
+        if not form["found"]:
+            raise LoginUrlError("出错啦！网页中没有找到LoginForm")
+        params = form["params"]
+        salt = form["salt"]
+        self.formType = form["formType"]
+        self.captcha_type = "slider" if form["slider"] else "code"
         # 将用户名填入即将提交的参数中
         params["username"] = self.username
-        # 检查验证码类型
-        self.captcha_type = "code"
-        if re.findall("sliderCaptchaDiv", html):
-            self.captcha_type = "slider"
         # 将密码填入即将提交的参数中
         if salt:
             params["password"] = Utils.encryptAES(self.password, salt)
@@ -141,7 +104,7 @@ class casLogin:
                 if res.status_code == 200 or res.status_code == 404:
                     return self.session.cookies
                 else:
-                    raise Exception("登录失败，请反馈BUG")
+                    raise LoginUrlError("登录失败，请反馈BUG")
         elif data.status_code == 200:
             print(data.content)
             soup = BeautifulSoup(data.text, "lxml")
@@ -182,7 +145,7 @@ class casLogin:
             else:
                 print(data.text)
                 error_tip = ""
-            raise Exception(
+            raise LoginUrlError(
                 "教务系统出现了问题啦！返回状态码："
                 + str(data.status_code)
                 + "\n错误提示: "
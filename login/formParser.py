@@ -0,0 +1,118 @@
+import re
+from html import unescape
+
+
+class FormParser:
+    """
+    登录页面表单解析
+    :feature: 预编译的正则, 一次遍历页面中的form/input标签
+    :feature: 一次返回表单类型、需要提交的参数、salt、验证码标记
+    """
+
+    knownForms = ("casLoginForm", "loginFromId", "fm1")  # 按优先级排列的表单id
+    buttonTypes = frozenset(("button", "checkbox", "file", "image", "radio", "reset", "submit"))
+    # form标签和input标签(标签名不区分大小写, 属性值中的">"不会截断标签); 以字面前缀开头的模式可以快速跳过其余文本
+    formPattern = re.compile(r"<form\b((?:\"[^\"]*\"|'[^']*'|[^'\">])*)>", re.I)
+    formEndPattern = re.compile(r"</form\s*>|<form\b", re.I)
+    inputPattern = re.compile(r"<input\b((?:\"[^\"]*\"|'[^']*'|[^'\">])*)>", re.I)
+    attrPattern = re.compile(
+        r"([^\s=/>\"']+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>\"']+)))?"
+    )
+    passwordPattern = re.compile("password", re.I)
+    saltPattern = re.compile("EncryptSalt", re.I)
+    scriptSaltPattern = re.compile(r'var pwdDefaultEncryptSalt ?= ?"(.*?)"')
+
+    @staticmethod
+    def parse(html: str, formId: str = None, skipButtons: bool = True):
+        """
+        解析登录页面
+        :params formId: 只解析该id的表单(为None时解析所有包含"password"的表单)
+        :params skipButtons: 是否排除按钮、复选框等非文本类型的input
+        :returns dict: {
+            "formType": 页面中优先级最高的已知表单id(没有时为""),
+            "found": 是否找到了要解析的表单,
+            "params": 要提交的参数{name: value},
+            "inputIds": 要解析的表单中input的id,
+            "salt": 密码加密的salt(没有时为""),
+            "slider": 是否为滑块验证码,
+        }
+        """
+        formIds = set()
+        found = False
+        params = {}
+        inputIds = set()
+        salt = ""
+        pos = 0
+        while True:
+            # 依次找到每个form的开始和结束位置, 只在form内部查找input
+            m = FormParser.formPattern.search(html, pos)
+            if not m:
+                break
+            formAttrs = FormParser.parseAttrs(m.group(1))
+            if formAttrs.get("id"):
+                formIds.add(formAttrs["id"].lower())
+            # form几乎不会嵌套form, 遇到下一个form标签时也视为结束
+            end = FormParser.formEndPattern.search(html, m.end())
+            end = end.start() if end else len(html)
+            if FormParser._selectForm(html, m.end(), end, formAttrs, formId):
+                found = True
+                salt = FormParser._readInputs(html, m.end(), end, params, inputIds, skipButtons) or salt
+            pos = end
+
+        if not salt:
+            # salt可能藏在script中
+            maySalt = FormParser.scriptSaltPattern.search(html)
+            if maySalt:
+                salt = maySalt.group(1)
+        formType = ""
+        for knownForm in FormParser.knownForms:
+            if knownForm.lower() in formIds:
+                formType = knownForm
+                break
+        return {
+            "formType": formType,
+            "found": found,
+            "params": params,
+            "inputIds": inputIds,
+            "salt": salt,
+            "slider": "sliderCaptchaDiv" in html,
+        }
+
+    @staticmethod
+    def parseAttrs(attrs: str):
+        """解析标签属性(属性名转为小写, 重复的属性取第一个, 没有值的属性为"")"""
+        result = {}
+        for name, v1, v2, v3 in FormParser.attrPattern.findall(attrs):
+            name = name.lower()
+            if name not in result:
+                value = v1 or v2 or v3
+                result[name] = unescape(value) if "&" in value else value
+        return result
+
+    @staticmethod
+    def _selectForm(html: str, start: int, end: int, formAttrs: dict, formId: str):
+        """判断form是否需要解析"""
+        if formId is not None:
+            return formAttrs.get("id") == formId
+        return FormParser.passwordPattern.search(html, start, end) is not None
+
+    @staticmethod
+    def _readInputs(html: str, start: int, end: int, params: dict, inputIds: set, skipButtons: bool):
+        """
+        读取form中的input, 填入params和inputIds
+        :returns str: input中的salt(没有时为"")
+        """
+        salt = ""
+        for m in FormParser.inputPattern.finditer(html, start, end):
+            attrs = FormParser.parseAttrs(m.group(1))
+            if attrs.get("id"):
+                inputIds.add(attrs["id"])
+            # 查找salt
+            if FormParser.saltPattern.search(m.group(1)):
+                salt = attrs.get("value", "")
+            # 排除非文本类型的input元素
+            if skipButtons and attrs.get("type", "").lower() in FormParser.buttonTypes:
+                continue
+            if attrs.get("name"):
+                params[attrs["name"]] = attrs.get("value", "")
+        return salt
@@ -9,6 +9,7 @@ from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentClo
 from tencentcloud.ocr.v20181119 import ocr_client, models
 from urllib3.exceptions import InsecureRequestWarning
 from login.Utils import Utils
+from liteTools import LoginUrlError
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -31,15 +32,18 @@ class iapLogin:
 
     def login(self):
         params = {}
-        self.ltInfo = self.session.post(f'{self.host}iap/security/lt', data=json.dumps({})).json()
+        try:
+            self.ltInfo = self.session.post(f'{self.host}iap/security/lt', data=json.dumps({})).json()
+        except ValueError:
+            # 返回的不是json(比如被重定向到了其他页面)
+            raise LoginUrlError('出错啦！没有获取到iap登录参数')
         params['lt'] = self.ltInfo['result']['_lt']
         params['rememberMe'] = 'false'
         params['dllt'] = ''
         params['mobile'] = ''
         params['username'] = self.username
         params['password'] = self.password
-        needCaptcha = self.getNeedCaptchaUrl()
-        if needCaptcha:
+        if self.getNeedCaptchaUrl():
             imgUrl = f'{self.host}iap/generateCaptcha?ltId={self.ltInfo["result"]["_lt"]}'
             code = Utils.getCodeFromImg(self.session, imgUrl)
             params['captcha'] = code
@@ -54,7 +58,7 @@ class iapLogin:
             self.count += 1
             if data['resultCode'] == 'CAPTCHA_NOTMATCH':
                 if self.count < 10:
-                    self.login()
+                    return self.login()
                 else:
                     raise Exception('验证码错误超过10次，请检查')
             elif data['resultCode'] == 'FAIL_UPNOTMATCH':
@@ -0,0 +1,195 @@
+import bisect
+import itertools
+import threading
+import time
+import traceback
+
+from liteTools import LL
+
+
+class _Wake:
+    """队列中代表一个暂停中的任务: 被调度时唤醒该任务的线程, 而不是启动新线程"""
+
+    def __init__(self, lane: str = None):
+        self.lane = lane
+        self.event = threading.Event()
+
+
+class TaskScheduler:
+    """
+    任务调度器: 以有界线程池执行任务队列
+    :feature: 全局并发数限制同时执行的任务数量
+    :feature: 学校并发数限制同一学校(同一租户域名)同时执行的任务数量
+    :feature: 任务可以延迟执行(用于失败重试的退避等待)
+    :feature: 到期的任务按优先级(比如截止时间)先后执行, 优先级相同时按到期时间先后执行
+    :feature: 执行中的任务可以暂停等待(park), 等待期间让出执行位置; 恢复时可以进入有单独并发数上限的通道(lane)
+    """
+
+    _local = threading.local()  # 工作线程的调度上下文(context: (scheduler, hostKey, priority), lanes: 占用的通道)
+
+    def __init__(self, concurrency: int = 1, hostConcurrency: int = 0, laneLimits: dict = None):
+        """
+        :params concurrency: 全局并发数(为1时在当前线程中依次执行)
+        :params hostConcurrency: 同一学校的并发数上限(为0时不限制)
+        :params laneLimits: 各通道的并发数上限{通道名: 上限}(为0时不限制)
+        """
+        self.concurrency: int = max(int(concurrency), 1)
+        self.hostConcurrency: int = max(int(hostConcurrency), 0)
+        self.laneLimits: dict = {k: max(int(v), 0) for k, v in (laneLimits or {}).items()}
+        self._queue: list = []  # 待执行任务队列(按到期时间排序), 每一项为(readyTime, seq, priority, hostKey, job)
+        self._seq = itertools.count()  # 到期时间相同时, 按加入队列的顺序执行
+        self._running: int = 0  # 正在执行的任务数(不包括暂停中的任务)
+        self._hostRunning: dict = {}  # 各学校正在执行的任务数
+        self._laneRunning: dict = {}  # 各通道正在执行的任务数
+        self._cond = threading.Condition()
+
+    def submit(self, job, hostKey: str = "", delay: float = 0, priority: float = 0):
+        """
+        将任务加入队列(执行中的任务也可以调用, 比如提交重试)
+        :params job: 任务(会被传入worker)
+        :params hostKey: 任务所属学校(用于学校并发数限制)
+        :params delay: 延迟执行的秒数
+        :params priority: 优先级(越小越先执行)
+        """
+        item = (time.time() + delay, next(self._seq), priority, hostKey, job)
+        with self._cond:
+            bisect.insort(self._queue, item)
+            self._cond.notify_all()
+
+    def run(self, worker):
+        """
+        执行队列中的任务, 队列清空且没有正在执行的任务时返回
+        :params worker: 任务执行函数, 接受job作为唯一参数
+        """
+        if self.concurrency == 1:
+            # 串行模式, 在当前线程中依次执行
+            while self._queue:
+                index, waitTime = self._nextJob()
+                if index is None:
+                    LL.log(0, "等待%.3f秒后执行下一个任务" % waitTime)
+                    time.sleep(waitTime)
+                    continue
+                job = self._queue.pop(index)[-1]
+                self._callWorker(worker, job)
+            return
+
+        LL.log(1, f"以并发模式执行任务(全局并发数{self.concurrency}, 学校并发数{self.hostConcurrency or '不限'})")
+        with self._cond:
+            while self._queue or self._running:
+                index, waitTime = self._nextJob()
+                if index is None:
+                    self._cond.wait(waitTime)
+                    continue
+                _, _, priority, hostKey, job = self._queue.pop(index)
+                self._running += 1
+                self._hostRunning[hostKey] = self._hostRunning.get(hostKey, 0) + 1
+                if isinstance(job, _Wake):
+                    # 唤醒暂停中的任务
+                    if job.lane:
+                        self._laneRunning[job.lane] = self._laneRunning.get(job.lane, 0) + 1
+                    job.event.set()
+                    continue
+                threading.Thread(
+                    target=self._work, args=(worker, hostKey, priority, job), daemon=True
+                ).start()
+
+    def _nextJob(self):
+        """
+        寻找队列中可以开始执行的任务
+        :returns (index, waitTime): 任务在队列中的位置(没有可执行任务时为None); 最多需要等待的秒数(None代表等待通知)
+        """
+        if self._running >= self.concurrency:
+            return None, None
+        now = time.time()
+        best = None
+        for i, (readyTime, _, priority, hostKey, _) in enumerate(self._queue):
+            if readyTime > now:
+                # 队列按到期时间排序, 之后的任务都未到期
+                if best is None:
+                    return None, readyTime - now
+                break
+            if self.hostConcurrency and self._hostRunning.get(hostKey, 0) >= self.hostConcurrency:
+                continue
+            job = self._queue[i][-1]
+            if isinstance(job, _Wake) and job.lane and not self._laneFree(job.lane):
+                continue
+            if best is None or priority < self._queue[best][2]:
+                best = i
+        return best, None
+
+    def _laneFree(self, lane: str):
+        """通道是否还有空闲位置"""
+        limit = self.laneLimits.get(lane, 0)
+        return not limit or self._laneRunning.get(lane, 0) < limit
+
+    def _work(self, worker, hostKey, priority, job):
+        """工作线程执行函数"""
+        TaskScheduler._local.context = (self, hostKey, priority)
+        TaskScheduler._local.lanes = set()
+        try:
+            self._callWorker(worker, job)
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._hostRunning[hostKey] -= 1
+                # 任务结束时释放仍占用的通道
+                for lane in TaskScheduler._local.lanes:
+                    self._laneRunning[lane] -= 1
+                self._cond.notify_all()
+            TaskScheduler._local.context = None
+
+    @staticmethod
+    def park(delay: float = 0, lane: str = None):
+        """
+        暂停当前任务(在任务执行中调用, 比如等待验证码刷新): 等待期间让出执行位置, 其他任务可以执行
+        等待结束且有空闲位置时继续执行
+        :params delay: 等待的秒数
+        :params lane: 继续执行时进入的通道(占用通道的一个位置, 直到调用leaveLane或任务结束)
+        不在并发执行的工作线程中时(串行模式), 直接在当前线程中等待
+        """
+        context = getattr(TaskScheduler._local, "context", None)
+        if context is None:
+            if delay > 0:
+                time.sleep(delay)
+            return
+        scheduler, hostKey, priority = context
+        lanes = TaskScheduler._local.lanes
+        wake = _Wake(lane)
+        with scheduler._cond:
+            if delay <= 0 and lane and (lane in lanes or scheduler._laneFree(lane)):
+                # 不需要等待, 且通道有空位: 直接进入通道
+                if lane not in lanes:
+                    scheduler._laneRunning[lane] = scheduler._laneRunning.get(lane, 0) + 1
+                    lanes.add(lane)
+                return
+            # 等待期间不占用执行位置和通道
+            scheduler._running -= 1
+            scheduler._hostRunning[hostKey] -= 1
+            if lane in lanes:
+                scheduler._laneRunning[lane] -= 1
+                lanes.discard(lane)
+            bisect.insort(scheduler._queue, (time.time() + delay, next(scheduler._seq), priority, hostKey, wake))
+            scheduler._cond.notify_all()
+        wake.event.wait()
+        if lane:
+            lanes.add(lane)
+
+    @staticmethod
+    def leaveLane(lane: str):
+        """当前任务离开通道(释放通道的位置)"""
+        context = getattr(TaskScheduler._local, "context", None)
+        if context is None or lane not in TaskScheduler._local.lanes:
+            return
+        scheduler = context[0]
+        with scheduler._cond:
+            scheduler._laneRunning[lane] -= 1
+            TaskScheduler._local.lanes.discard(lane)
+            scheduler._cond.notify_all()
+
+    @staticmethod
+    def _callWorker(worker, job):
+        """执行任务, 捕获任务外溢的异常(避免打断整个任务队列)"""
+        try:
+            worker(job)
+        except Exception as e:
+            LL.log(3, f"任务调度出错[{e}]\n{traceback.format_exc()}")
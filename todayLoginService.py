@@ -1,14 +1,16 @@
+import json
 import random
-import re
 
 
 import requests
+from requests.cookies import create_cookie
 from urllib3.exceptions import InsecureRequestWarning
 from login.Utils import Utils
 from login.casLogin import casLogin
 from login.iapLogin import iapLogin
 from login.RSALogin import RSALogin
-from liteTools import TaskError, LL, ProxyGet, reqSession
+from localStore import TenantDirectory
+from liteTools import TaskError, LL, ProxyGet, reqSession, LoginUrlError
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -30,10 +32,7 @@ class TodayLoginService:
         self.schoolName = userInfo["schoolName"]
         self.session = reqSession()
         headers = {"User-Agent": random.choice(Utils.getUserAgents())}
-        # 关闭多余的连接
-        self.session.keep_alive = False
-        # 增加重试次数
-        self.session.adapters.DEFAULT_RETRIES = 5
+        # 连接池和重试策略见reqSession
         self.session.headers = headers
         # 如果设置了用户的代理，那么该用户将走代理的方式进行访问
         pg = userInfo["proxy"]
@@ -46,90 +45,92 @@ class TodayLoginService:
         self.login_host = ""
         self.loginEntity = None
 
-    # 通过学校名称借助api获取学校的登陆url
+    # 通过学校名称获取学校的登陆url(学校目录有本地缓存)
     def getLoginUrlBySchoolName(self):
-        schools = self.session.get(
-            "https://mobile.campushoy.com/v6/config/guest/tenant/list",
-            verify=False,
-            hooks=dict(response=[Utils.checkStatus]),
-        ).json()["data"]
-        flag = True
-        for item in schools:
-            if item["name"] == self.schoolName:
-                if item["joinType"] == "NONE":
-                    raise TaskError(self.schoolName + "未加入今日校园，请检查...", 301)
-                else:
-                    LL.log(1, f"「{self.schoolName}」接入今日校园方式为「{item['joinType']}」")
-                flag = False
-                params = {"ids": item["id"]}
-                data = self.session.get(
-                    "https://mobile.campushoy.com/v6/config/guest/tenant/info",
-                    params=params,
-                    verify=False,
-                    hooks=dict(response=[Utils.checkStatus]),
-                ).json()["data"][0]
-                joinType = data["joinType"]
-                idsUrl = data["idsUrl"]
-                ampUrl = data["ampUrl"]
-                if "campusphere" in ampUrl or "cpdaily" in ampUrl:
-                    self.host = re.findall("\w{4,5}\:\/\/.*?\/", ampUrl)[0]
-                    status_code = 0
-                    while status_code != 200:
-                        newAmpUrl = self.session.get(
-                            ampUrl, allow_redirects=False, verify=False
-                        )
-                        status_code = newAmpUrl.status_code
-                        if "Location" in newAmpUrl.headers:
-                            ampUrl = newAmpUrl.headers["Location"]
-                    self.login_url = ampUrl
-                    self.login_host = re.findall("\w{4,5}\:\/\/.*?\/", self.login_url)[
-                        0
-                    ]
-                ampUrl2 = data["ampUrl2"]
-                if "campusphere" in ampUrl2 or "cpdaily" in ampUrl2:
-                    self.host = re.findall("\w{4,5}\:\/\/.*?\/", ampUrl2)[0]
-                    ampUrl2 = self.session.get(ampUrl2, verify=False).url
-                    self.login_url = ampUrl2
-                    self.login_host = re.findall(r"\w{4,5}\:\/\/.*?\/", self.login_url)[
-                        0
-                    ]
-                break
+        school = TenantDirectory.resolve(self.schoolName, self.session)
+        self.host = school["host"]
+        self.login_url = school["login_url"]
+        self.login_host = school["login_host"]
 
     # 通过登陆url判断采用哪种登陆方式
-    def checkLogin(self):
-        LL.log(1, f"学校的教务系统登录地址为「{self.login_url}」")
+    def detectStrategy(self):
         if self.login_url.find("/iap") != -1:
-            self.loginEntity = iapLogin(
-                self.username,
-                self.password,
-                self.login_url,
-                self.login_host,
-                self.session,
-            )
+            return "iap"
         elif (
             self.login_url.find("kmu.edu.cn") != -1
             or self.login_url.find("hytc.edu.cn") != -1
         ):
-            self.loginEntity = RSALogin(
-                self.username,
-                self.password,
-                self.login_url,
-                self.login_host,
-                self.session,
-            )
+            return "rsa"
         else:
-            self.loginEntity = casLogin(
-                self.username,
-                self.password,
-                self.login_url,
-                self.login_host,
-                self.session,
-            )
+            return "cas"
+
+    # 选择登陆方式并登陆
+    def checkLogin(self):
+        LL.log(1, f"学校的教务系统登录地址为「{self.login_url}」")
+        loginClass = {"iap": iapLogin, "rsa": RSALogin, "cas": casLogin}[
+            self.detectStrategy()
+        ]
+        self.loginEntity = loginClass(
+            self.username,
+            self.password,
+            self.login_url,
+            self.login_host,
+            self.session,
+        )
         # 统一登录流程
         self.session.cookies = self.loginEntity.login()
 
+    # 导出登录状态(用于本地缓存)
+    def dumpSession(self):
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": c.secure,
+                "expires": c.expires,
+            }
+            for c in self.session.cookies
+        ]
+        return {
+            "host": self.host,
+            "headers": {"User-Agent": self.session.headers.get("User-Agent")},
+            "cookies": cookies,
+        }
+
+    # 从本地缓存恢复登录状态
+    def restoreSession(self, sessionData):
+        self.host = sessionData["host"]
+        self.session.headers.update(sessionData.get("headers", {}))
+        for c in sessionData["cookies"]:
+            self.session.cookies.set_cookie(create_cookie(**c))
+
+    # 通过一次接口请求检查登录状态是否有效
+    def checkSession(self, probeApi):
+        return TodayLoginService.probeSession(self.session, self.host, probeApi)
+
+    @staticmethod
+    def probeSession(session, host, probeApi):
+        try:
+            res = session.post(
+                host + probeApi,
+                headers={"Content-Type": "application/json"},
+                data=json.dumps({}),
+                verify=False,
+            )
+            return res.status_code == 200 and isinstance(res.json().get("datas"), dict)
+        except Exception as e:
+            LL.log(1, f"登录状态检查失败[{e}]")
+            return False
+
     # 本地化登陆
     def login(self):
         # 获取学校登陆地址
         self.getLoginUrlBySchoolName()
-        self.checkLogin()
+        try:
+            self.checkLogin()
+        except LoginUrlError:
+            # 登录地址可能已经变化, 下次登录时重新获取(密码错误、验证码错误等不丢弃)
+            TenantDirectory.drop(self.schoolName)
+            raise